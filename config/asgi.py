@@ -1,14 +1,19 @@
 import os
+from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
+from channels.security.websocket import AllowedHostsOriginValidator
 from django.core.asgi import get_asgi_application
-from products import routing
 
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Django is set up before the routing imports the consumers and, through them, the models
+django_asgi_app = get_asgi_application()
+
+from products import routing  # noqa: E402
 
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
-    "websocket": URLRouter(
+    "http": django_asgi_app,
+    "websocket": AllowedHostsOriginValidator(AuthMiddlewareStack(URLRouter(
         routing.websocket_urlpatterns
-    ),
+    ))),
 })
@@ -40,10 +40,13 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'mptt',
     'products.apps.ProductsConfig',
     'shopping.apps.ShoppingConfig',
     'sales.apps.SalesConfig',
+    'reports.apps.ReportsConfig',
+    'outbox.apps.OutboxConfig',
     'djangoql',
     'django_extensions',
     'channels',
@@ -135,7 +138,7 @@ JAZZMIN_SETTINGS = {
     "hide_models": [],
 
     # List of apps (and/or models) to base side menu ordering off of (does not need to contain all apps/models)
-    "order_with_respect_to": ["auth", "shopping", "products", "sales"],
+    "order_with_respect_to": ["auth", "shopping", "products", "sales", "reports", "outbox"],
 
     # Custom links to append to app groups, keyed on app name
     # "custom_links": {
@@ -161,12 +164,18 @@ JAZZMIN_SETTINGS = {
         "products.Supplier": "fas fa-truck",
         "products.ProductIssue": "fas fa-arrow-down",
         "products.Inventory": "fas fa-cubes",
+        "products.InventoryMovement": "fas fa-exchange-alt",
         "shopping.Purchase": "fas fa-shopping-bag",
         "shopping.PurchaseItem": "fas fa-cart-plus",
         "sales.Sale": "fas fa-shopping-cart",
         "sales.SaleItem": "fas fa-cart-arrow-down",
         "sales.Shipping": "fas fa-shipping-fast",
-        "sales.Customer": "fas fa-user-circle"
+        "sales.Customer": "fas fa-user-circle",
+        "sales.Return": "fas fa-undo",
+        "reports.DailyProductSales": "fas fa-chart-line",
+        "reports.DailyCategorySales": "fas fa-chart-pie",
+        "reports.DailyCustomerSales": "fas fa-chart-bar",
+        "outbox.OutboxEvent": "fas fa-paper-plane"
     },
     # Icons that are used when one is not manually specified
     "default_icon_parents": "fas fa-chevron-circle-right",
@@ -278,7 +287,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
-ASGI_APPLICATION = 'config.routing.application'
+ASGI_APPLICATION = 'config.asgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
@@ -304,6 +313,22 @@ CACHES = {
     }
 }
 
+# Channel layer carrying the stock updates and alerts to the WebSocket consumers
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'CONFIG': {
+            'hosts': ['redis://127.0.0.1:6379/2'],
+        },
+    }
+}
+
+# Seconds a pending sale holds its stock before the reservation expires
+STOCK_RESERVATION_TTL = config("STOCK_RESERVATION_TTL", default=15 * 60, cast=int)
+
+# Seconds stock updates are held so several changes of a product go out as one message
+STOCK_ALERT_WINDOW = config("STOCK_ALERT_WINDOW", default=0.5, cast=float)
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
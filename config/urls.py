@@ -5,5 +5,8 @@ from django.conf.urls.static import static
 
 urlpatterns = [
     # path('', include('admin_material.urls')),
+    path('api/catalog/', include('products.urls')),
+    path('api/outbox/', include('outbox.urls')),
+    path('api/exports/', include('reports.urls')),
     path('', admin.site.urls),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,17 @@
+from django.contrib import admin
+
+from .models import OutboxEvent
+
+
+# Events are written by the changes they follow and marked by the dispatcher, the admin only shows them
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'topic', 'created_at', 'attempts', 'processed_at')
+    list_filter = ('topic', ('processed_at', admin.EmptyFieldListFilter))
+    search_fields = ('topic', 'last_error')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,98 @@
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q
+from django.utils import timezone
+
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+# Handler of each topic; it gets the payloads of a whole batch at once
+HANDLERS = {}
+# Longest wait between two deliveries of a failing event, in seconds
+MAX_BACKOFF = 300
+
+# Delivery counters shared by every worker through the cache, reported by outbox_stats()
+COUNTERS = ('dispatched', 'failed', 'batches')
+
+
+def _count(name, amount=1):
+    if not cache.add(f'outbox:{name}', amount, timeout=None):
+        cache.incr(f'outbox:{name}', amount)
+
+
+def handler(topic):
+    def register(function):
+        HANDLERS[topic] = function
+        return function
+    return register
+
+
+def dispatch_batch(batch_size=100):
+    """
+    Delivers up to `batch_size` pending events, oldest first, and returns how many it handled.
+
+    The events stay locked until they are marked, so several workers can drain the outbox
+    side by side (rows locked by one are skipped by the others). An event is only marked
+    processed after its handler returned; a crash in between delivers it again.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        events = list(OutboxEvent.objects.select_for_update(skip_locked=True).filter(
+            processed_at__isnull=True, available_at__lte=now).order_by('available_at', 'pk')[:batch_size])
+        by_topic = defaultdict(list)
+        for event in events:
+            by_topic[event.topic].append(event)
+
+        for topic, topic_events in by_topic.items():
+            try:
+                with transaction.atomic():
+                    HANDLERS[topic]([event.payload for event in topic_events])
+            except Exception as error:
+                logger.exception("Outbox handler of %s failed for %s events", topic, len(topic_events))
+                _count('failed', len(topic_events))
+                for event in topic_events:
+                    event.attempts += 1
+                    event.last_error = f"{type(error).__name__}: {error}"
+                    event.available_at = now + timedelta(seconds=min(2 ** event.attempts, MAX_BACKOFF))
+            else:
+                processed_at = timezone.now()
+                _count('dispatched', len(topic_events))
+                for event in topic_events:
+                    event.processed_at = processed_at
+                # Delivery lag of the slowest event of the batch, from the moment it was recorded
+                cache.set('outbox:last_lag_ms', int(max(
+                    (processed_at - event.created_at).total_seconds() for event in topic_events) * 1000), None)
+
+        OutboxEvent.objects.bulk_update(events, ['attempts', 'last_error', 'available_at', 'processed_at'])
+    if events:
+        _count('batches')
+    return len(events)
+
+
+def purge_processed(older_than):
+    # Deletes the events delivered before `older_than`, which are only kept for inspection.
+    deleted, _ = OutboxEvent.objects.filter(processed_at__lt=older_than).delete()
+    return deleted
+
+
+def outbox_stats():
+    now = timezone.now()
+    pending = OutboxEvent.objects.filter(processed_at__isnull=True).aggregate(
+        pending=Count('pk'),
+        retrying=Count('pk', filter=Q(attempts__gt=0)),
+        oldest=Min('created_at'),
+        most_attempts=Max('attempts'),
+    )
+    oldest = pending.pop('oldest')
+    counters = cache.get_many([f'outbox:{name}' for name in (*COUNTERS, 'last_lag_ms')])
+    return {
+        **{name: counters.get(f'outbox:{name}', 0) for name in (*COUNTERS, 'last_lag_ms')},
+        **pending,
+        # Age of the oldest undelivered event, the lag of the outbox as a whole
+        'lag_seconds': round((now - oldest).total_seconds(), 3) if oldest else 0,
+    }
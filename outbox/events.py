@@ -0,0 +1,15 @@
+from .models import OutboxEvent
+
+
+def emit(topic, **payload):
+    """
+    Records a side effect in the outbox. Call it inside the transaction of the change it
+    follows: the event commits or rolls back with that change, and the dispatcher delivers
+    it afterwards, at least once.
+    """
+    return OutboxEvent.objects.create(topic=topic, payload=payload)
+
+
+def emit_many(topic, payloads):
+    # Records one event per payload with a single INSERT, for changes made in bulk.
+    return OutboxEvent.objects.bulk_create([OutboxEvent(topic=topic, payload=payload) for payload in payloads])
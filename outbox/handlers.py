@@ -0,0 +1,41 @@
+from datetime import date
+
+from products.signals import stock_alerts
+from reports.dashboard import WIDGETS, refresh_widget
+from reports.rollups import refresh_sales
+from sales.models import Sale
+from .dispatcher import handler
+
+
+def _refresh_widgets(*names):
+    # The dashboard figures a change affects are recomputed instead of waiting for their TTL
+    for widget in WIDGETS:
+        if widget.name in names:
+            refresh_widget(widget)
+
+
+@handler('sale.changed')
+def sale_changed(payloads):
+    # Events of items edited or deleted carry the keys they counted under before, see sales/signals.py
+    previous = [(date.fromisoformat(payload['day']), payload.get('products', ()), payload.get('categories', ()),
+                 payload.get('customers', ())) for payload in payloads if 'day' in payload]
+    refresh_sales(Sale.objects.filter(pk__in={payload['sale_id'] for payload in payloads}), previous)
+    _refresh_widgets('todays_revenue', 'pending_sales', 'top_sellers')
+
+
+@handler('purchase.changed')
+def purchase_changed(payloads):
+    _refresh_widgets('low_stock')
+
+
+@handler('return.changed')
+def return_changed(payloads):
+    _refresh_widgets('open_returns')
+
+
+@handler('stock.alert')
+def stock_alert(payloads):
+    # Only the latest alert of each product in the batch is worth sending
+    latest = {payload['product_id']: payload for payload in payloads}
+    stock_alerts.send([(("stock_alerts",), alert) for alert in latest.values()])
+    _refresh_widgets('low_stock')
@@ -0,0 +1,33 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from outbox.dispatcher import dispatch_batch, outbox_stats, purge_processed
+
+
+class Command(BaseCommand):
+    help = "Delivers the pending outbox events to their handlers, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="Events handled per transaction")
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help="Seconds to wait when the outbox is empty")
+        parser.add_argument('--keep-days', type=int, default=7, help="Days delivered events are kept")
+        parser.add_argument('--once', action='store_true', help="Drain the outbox and exit instead of polling")
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            while dispatch_batch(options['batch_size']) == options['batch_size']:
+                pass
+            purged = purge_processed(timezone.now() - timedelta(days=options['keep_days']))
+            if options['once']:
+                stats = outbox_stats()
+                self.stdout.write(self.style.SUCCESS(
+                    f"{stats['dispatched']} events delivered, {stats['failed']} failed, "
+                    f"{stats['pending']} pending, {purged} purged"))
+                return
+            time.sleep(options['interval'])
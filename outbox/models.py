@@ -0,0 +1,31 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+# Side effect of a committed change, waiting for the outbox dispatcher to deliver it
+class OutboxEvent(models.Model):
+    # What happened, e.g. "sale.changed"; the dispatcher picks the handler by topic
+    topic = models.CharField(max_length=50)
+    # Ids and values the handler needs
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(default=timezone.now)
+    # Failed deliveries are retried from this moment on
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # Set once the handler succeeded; the event is then only kept for a while for inspection
+    processed_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.topic} #{self.pk}"
+
+    class Meta:
+        db_table = "OutboxEvents"
+        verbose_name = "outbox event"
+        verbose_name_plural = "outbox events"
+        indexes = [
+            # The dispatcher only ever scans the pending events
+            models.Index(fields=['available_at', 'id'], condition=Q(processed_at__isnull=True),
+                         name='outbox_pending_idx'),
+        ]
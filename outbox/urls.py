@@ -0,0 +1,9 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'outbox'
+
+urlpatterns = [
+    path('metrics/', views.outbox_metrics, name='metrics'),
+]
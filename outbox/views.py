@@ -0,0 +1,12 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from .dispatcher import outbox_stats
+
+
+@staff_member_required
+@require_GET
+def outbox_metrics(request):
+    # Backlog and lag of the outbox, with the delivery counters of all the workers
+    return JsonResponse(outbox_stats())
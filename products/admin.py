@@ -1,10 +1,14 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR
 from mptt.admin import MPTTModelAdmin
 
+from .filters import MarginListFilter, StockListFilter, TopRelatedListFilter
 from .forms import ProductForm
 from .inlines import VariationInline
-from .models import Category, Supplier, Product, Variation, Inventory, ProductIssue
+from .paginators import EstimatedCountPaginator
+from .models import Category, Supplier, Product, Variation, Inventory, InventoryMovement, ProductIssue
 from .resources import ProductResource
+from .search import search_products
 
 
 # Admin panel settings for categories
@@ -32,24 +36,61 @@ class ProductAdmin(admin.ModelAdmin):
     inlines = [VariationInline]
     search_fields = ('name', 'description', 'category__name', 'supplier__name')
     list_filter = (
-        ('supplier', admin.RelatedOnlyFieldListFilter),
+        ('supplier', TopRelatedListFilter),
         ('created_at', admin.DateFieldListFilter),
+        StockListFilter,
+        MarginListFilter,
     )
-    readonly_fields = ('created_at',)
+    readonly_fields = ('created_at', 'stock')
     list_per_page = 10
     ordering = ('name', 'category', 'supplier', 'purchase_price', 'sale_price', 'created_at')
-    list_display = ('name', 'category', 'supplier', 'formatted_price', 'created_at', 'stock', 'is_available')
+    list_display = ('name', 'category', 'supplier', 'formatted_price', 'unit_profit', 'margin', 'markup', 'created_at',
+                    'stock', 'is_available')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # Margin, markup and unit profit are computed by the database, so they can be sorted and filtered on
+        return super().get_queryset(request).with_margins()
+
+    def get_search_results(self, request, queryset, search_term):
+        # Searches through the full-text and trigram indexes instead of ILIKE over search_fields
+        results = search_products(queryset, search_term)
+        # Results come by relevance unless a column was chosen
+        if search_term.strip() and ORDER_VAR not in request.GET:
+            results = results.order_by('-search_rank', *queryset.query.order_by)
+        return results, False
 
     def is_available(self, obj):
         return obj.stock > 0
 
     is_available.boolean = True
     is_available.short_description = 'Available'
+    is_available.admin_order_field = 'stock'
 
     def formatted_price(self, obj):
-        return f"{obj.purchase_price} - {obj.sale_price} - {obj.profit_margin}"
+        return f"{obj.purchase_price} - {obj.sale_price}"
 
     formatted_price.short_description = 'Price'
+    formatted_price.admin_order_field = 'sale_price'
+
+    def unit_profit(self, obj):
+        return obj.unit_profit
+
+    unit_profit.short_description = 'Unit profit'
+    unit_profit.admin_order_field = 'unit_profit'
+
+    def margin(self, obj):
+        return None if obj.margin is None else f"{obj.margin}%"
+
+    margin.short_description = 'Margin'
+    margin.admin_order_field = 'margin'
+
+    def markup(self, obj):
+        return None if obj.markup is None else f"{obj.markup}%"
+
+    markup.short_description = 'Markup'
+    markup.admin_order_field = 'markup'
 
 
 # Admin panel settings for variations
@@ -64,9 +105,34 @@ class ProductAdmin(admin.ModelAdmin):
 class InventoryAdmin(admin.ModelAdmin):
     list_display = ('product', 'current_stock', 'min_stock', 'max_stock', 'updated_at')
     search_fields = ('product__name',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+# The ledger is append-only, written by the stock movements themselves
+@admin.register(InventoryMovement)
+class InventoryMovementAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'product', 'quantity', 'reason', 'reference_id')
+    list_select_related = ('product',)
+    list_filter = ('reason',)
+    search_fields = ('product__name',)
+    date_hierarchy = 'created_at'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(ProductIssue)
 class ProductIssueAdmin(admin.ModelAdmin):
     list_display = ('product', 'issue_type', 'notes')
     search_fields = ('product__name', 'issue_type')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,42 @@
+from django.db import transaction
+from django.db.models import Case, Value, When
+
+from products.models import Product
+from products.signals import send_stock_alert, send_stock_update
+
+# Alert text for each stock level a product can move into
+MESSAGES = {
+    'out': "{name} is out of stock.",
+    'low': "{name} is running low: {available} units left, minimum {min_total}.",
+    'normal': "{name} is back to a normal stock of {available} units.",
+    'over': "{name} is overstocked: {available} units, maximum {max_total}.",
+}
+
+
+def detect_crossings(products):
+    """
+    Compares the stock level of the given products, as their inventories stand now, with the
+    level of their last alert, and alerts about the products that moved to another level.
+    Subscribers of every product get its new stock. It all costs one indexed read of the
+    written products, however often their stock changes.
+    """
+    rows = list(products.with_stock_level().values(
+        'pk', 'name', 'category_id', 'stock', 'reserved_stock', 'min_total', 'max_total', 'stock_level', 'level',
+    ).order_by())
+    crossed = [row for row in rows if row['stock_level'] != row['level']]
+    if crossed:
+        Product.objects.filter(pk__in=[row['pk'] for row in crossed]).update(stock_level=Case(
+            *(When(pk=row['pk'], then=Value(row['level'])) for row in crossed)))
+    for row in crossed:
+        # Alerts go through the outbox, so they commit or roll back with the stock change
+        available = row['stock'] - row['reserved_stock']
+        message = MESSAGES[row['level']].format(available=available, **row)
+        send_stock_alert(row['name'], message, product_id=row['pk'], level=row['level'], available=available)
+    # Updates are sent once the stock change commits, a rolled back sale tells nobody
+    transaction.on_commit(lambda: publish(rows), robust=True)
+    return crossed
+
+
+def publish(rows):
+    for row in rows:
+        send_stock_update(row['pk'], row['category_id'], row['stock'] - row['reserved_stock'])
@@ -4,3 +4,18 @@ from django.apps import AppConfig
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete, post_save
+        from products.autocomplete import invalidate_autocomplete
+        from products.categories import category_changed, product_deleted, product_saved
+        from products.models import Category, Product
+        from products.search import set_trigram_threshold
+        connection_created.connect(set_trigram_threshold)
+        post_save.connect(invalidate_autocomplete, sender=Product)
+        post_delete.connect(invalidate_autocomplete, sender=Product)
+        post_save.connect(category_changed, sender=Category)
+        post_delete.connect(category_changed, sender=Category)
+        post_save.connect(product_saved, sender=Product)
+        post_delete.connect(product_deleted, sender=Product)
@@ -0,0 +1,33 @@
+from products.cache import TwoTierCache
+from products.models import Product
+
+# Matches returned when the client does not ask for a number, and the most it may ask for
+AUTOCOMPLETE_LIMIT = 20
+MAX_AUTOCOMPLETE_LIMIT = 50
+# Longest term looked up; longer input is cut, a product name is at most 100 characters anyway
+MAX_TERM_LENGTH = 100
+
+# Matches by term. Names and prices change rarely, the namespace is dropped whenever a product is
+# saved or deleted; stock changes all the time and is not cached here (see product_autocomplete).
+autocomplete_cache = TwoTierCache('autocomplete', ttl=300)
+
+
+def match_products(term, limit=AUTOCOMPLETE_LIMIT):
+    """
+    (id, name, sale price, purchase price) of the first `limit` products, by name, whose name
+    starts with `term` ignoring case. A miss costs one query on the upper(name) prefix index.
+    """
+    term = ' '.join(term.split())[:MAX_TERM_LENGTH]
+
+    def compute():
+        queryset = Product.objects.order_by('name', 'pk')
+        if term:
+            queryset = queryset.filter(name__istartswith=term)
+        return list(queryset.values_list('pk', 'name', 'sale_price', 'purchase_price')[:limit])
+
+    return autocomplete_cache.get_or_set(f'{limit}:{term.upper()}', compute)
+
+
+def invalidate_autocomplete(sender, **kwargs):
+    # post_save/post_delete receiver of Product; bulk imports call it once per batch
+    autocomplete_cache.invalidate()
@@ -0,0 +1,181 @@
+import math
+import random
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.core.cache import cache as remote_cache
+
+# Every TwoTierCache by namespace, so their metrics can be reported together
+_registry = {}
+
+
+class TwoTierCache:
+    """
+    Cache with a bounded in-process LRU in front of the shared cache (Redis).
+
+    Keys live in a namespace whose version is kept in the shared cache; invalidate() bumps it,
+    which drops every key of the namespace in all processes at once. Processes re-read the
+    version every `local_ttl` seconds, which is also the longest a local entry is served.
+
+    get_or_set() lets a single caller recompute a missing key while the others wait for its
+    result, and recomputes a little before expiry (probabilistic early expiration), so hot keys
+    never expire for everybody at the same moment.
+    """
+
+    def __init__(self, namespace, ttl=300, local_ttl=5, maxsize=1024, lock_timeout=10, beta=1.0):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.maxsize = maxsize
+        self.lock_timeout = lock_timeout
+        self.beta = beta
+        self.metrics = Counter()
+        self._local = OrderedDict()
+        self._local_lock = threading.Lock()
+        self._flights = {}
+        self._version = (None, 0)
+        _registry[namespace] = self
+
+    # Namespace versions
+
+    def _version_key(self):
+        return f'{self.namespace}:version'
+
+    def version(self):
+        version, checked_at = self._version
+        if version is None or time.monotonic() - checked_at > self.local_ttl:
+            version = remote_cache.get_or_set(self._version_key(), 1, timeout=None)
+            self._version = (version, time.monotonic())
+        return version
+
+    def invalidate(self):
+        # Drops every key of the namespace, in this process right away and in the others within local_ttl.
+        try:
+            version = remote_cache.incr(self._version_key())
+        except ValueError:
+            version = 2
+            remote_cache.set(self._version_key(), version, timeout=None)
+        self._version = (version, time.monotonic())
+        with self._local_lock:
+            self._local.clear()
+        self.metrics['invalidations'] += 1
+
+    def _remote_key(self, key):
+        return f'{self.namespace}:{self.version()}:{key}'
+
+    # In-process LRU
+
+    def _local_get(self, key):
+        with self._local_lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return entry
+
+    def _local_set(self, key, value, ttl):
+        with self._local_lock:
+            self._local[key] = (value, time.monotonic() + min(ttl, self.local_ttl))
+            self._local.move_to_end(key)
+            while len(self._local) > self.maxsize:
+                self._local.popitem(last=False)
+                self.metrics['local_evictions'] += 1
+
+    # Reads and writes
+
+    def get_or_set(self, key, compute, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        remote_key = self._remote_key(key)
+
+        entry = self._local_get(remote_key)
+        if entry is not None:
+            self.metrics['local_hits'] += 1
+            return entry[0]
+
+        envelope = remote_cache.get(remote_key)
+        if envelope is not None:
+            value, delta, expires_at = envelope
+            # Early recompute gets likelier as expiry nears and the slower the value is to compute
+            if time.time() - delta * self.beta * math.log(1 - random.random()) < expires_at:
+                self.metrics['remote_hits'] += 1
+                self._local_set(remote_key, value, ttl)
+                return value
+            self.metrics['early_recomputes'] += 1
+        else:
+            self.metrics['misses'] += 1
+
+        return self._recompute(remote_key, compute, ttl, envelope)
+
+    def _recompute(self, remote_key, compute, ttl, stale):
+        # One thread per process and one process overall computes a key; the others reuse its result.
+        with self._local_lock:
+            flight = self._flights.setdefault(remote_key, threading.Lock())
+        with flight:
+            entry = self._local_get(remote_key)
+            if entry is not None:
+                self.metrics['coalesced'] += 1
+                return entry[0]
+
+            lock_key = f'{remote_key}:lock'
+            owns_lock = remote_cache.add(lock_key, True, timeout=self.lock_timeout)
+            if not owns_lock:
+                if stale is not None:
+                    self.metrics['stale_served'] += 1
+                    return stale[0]
+                envelope = self._wait_for(remote_key)
+                if envelope is not None:
+                    self._local_set(remote_key, envelope[0], ttl)
+                    return envelope[0]
+            try:
+                started = time.time()
+                value = compute()
+                delta = time.time() - started
+                remote_cache.set(remote_key, (value, delta, time.time() + ttl), timeout=ttl)
+                self._local_set(remote_key, value, ttl)
+                self.metrics['recomputes'] += 1
+                return value
+            finally:
+                if owns_lock:
+                    remote_cache.delete(lock_key)
+                with self._local_lock:
+                    self._flights.pop(remote_key, None)
+
+    def _wait_for(self, remote_key):
+        # Polls the shared cache while another process computes the key, up to lock_timeout.
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            envelope = remote_cache.get(remote_key)
+            if envelope is not None:
+                self.metrics['coalesced'] += 1
+                return envelope
+        return None
+
+    def delete(self, *keys):
+        # Deletes single keys; other processes may keep serving them from memory for up to local_ttl.
+        remote_keys = [self._remote_key(key) for key in keys]
+        remote_cache.delete_many(remote_keys)
+        with self._local_lock:
+            for remote_key in remote_keys:
+                self._local.pop(remote_key, None)
+
+    def stats(self):
+        lookups = self.metrics['local_hits'] + self.metrics['remote_hits'] + self.metrics['misses']
+        hits = self.metrics['local_hits'] + self.metrics['remote_hits']
+        return {
+            **self.metrics,
+            'local_size': len(self._local),
+            'hit_ratio': round(hits / lookups, 4) if lookups else None,
+        }
+
+
+def cache_stats():
+    return {namespace: two_tier.stats() for namespace, two_tier in sorted(_registry.items())}
+
+
+# Catalog responses, keyed by their ETag so a change in the catalog never serves an old payload
+catalog_cache = TwoTierCache('catalog', ttl=600)
@@ -0,0 +1,144 @@
+import hashlib
+from collections import namedtuple
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q, Subquery
+
+from products.cache import TwoTierCache
+from products.models import Category, Product
+
+# A category and its MPTT range: the categories of its subtree are those of the same tree_id
+# whose lft lies between its lft and rght
+CategoryNode = namedtuple('CategoryNode', ['id', 'name', 'parent_id', 'tree_id', 'lft', 'rght', 'level'])
+
+# The category tree, the product counts of each top-level tree and the storefront menu.
+# Once a transaction commits, its category changes drop the tree and the counts of the trees
+# they touch, its product changes only the counts of the trees of their categories; other
+# processes follow within local_ttl. Nothing is rebuilt before the commit.
+category_cache = TwoTierCache('categories', ttl=3600)
+
+
+class CategoryTree:
+    """
+    Every category in tree order, read with one query and held in memory, so the menu
+    and breadcrumbs are answered without the database.
+    """
+
+    def __init__(self, nodes):
+        self.nodes = {node.id: node for node in nodes}
+
+    def roots(self):
+        return [node for node in self.nodes.values() if node.parent_id is None]
+
+    def ancestors(self, category_id):
+        # From the root down to the category itself, empty for an unknown category
+        path = []
+        node = self.nodes.get(category_id)
+        while node is not None:
+            path.append(node)
+            node = self.nodes.get(node.parent_id)
+        return path[::-1]
+
+    def breadcrumbs(self, category_id):
+        return [{'id': node.id, 'name': node.name} for node in self.ancestors(category_id)]
+
+
+def subtree_filter(category_ids, field='category'):
+    """
+    Q matching the rows whose `field` category lies in the subtree of any of `category_ids`
+    (the categories themselves with field=None), as a range join on the MPTT columns. The ranges
+    are read by the same query, so a tree moved since it was cached never selects the wrong rows.
+    Unknown ids match nothing.
+    """
+    prefix = f'{field}__' if field else ''
+    return Q(Exists(Category.objects.filter(
+        pk__in=category_ids, tree_id=OuterRef(f'{prefix}tree_id'),
+        lft__lte=OuterRef(f'{prefix}lft'), rght__gte=OuterRef(f'{prefix}lft'),
+    )))
+
+
+def get_category_tree():
+    def build():
+        return CategoryTree(CategoryNode(*row) for row in Category.objects.order_by('tree_id', 'lft').values_list(
+            'id', 'name', 'parent_id', 'tree_id', 'lft', 'rght', 'level'))
+
+    return category_cache.get_or_set('tree', build)
+
+
+def category_counts(root_id):
+    """
+    {category id: (products, products of the subtree)} for the categories of one top-level tree,
+    counted by the database through the MPTT related-count annotations.
+    """
+    def compute():
+        # The tree is found from the root itself, the cached tree may be older than the counts
+        queryset = Category.objects.filter(tree_id=Subquery(Category.objects.filter(pk=root_id).values('tree_id')))
+        queryset = Category.objects.add_related_count(queryset, Product, 'category', 'product_count')
+        queryset = Category.objects.add_related_count(queryset, Product, 'category', 'total_products', cumulative=True)
+        return {pk: (count, total) for pk, count, total in
+                queryset.order_by().values_list('pk', 'product_count', 'total_products')}
+
+    return category_cache.get_or_set(f'counts:{root_id}', compute)
+
+
+def category_menu():
+    """
+    ETag and payload of the storefront category menu: every category in tree order with its
+    breadcrumbs and product counts, assembled from the cached tree and counts.
+    """
+    def build():
+        tree = get_category_tree()
+        counts = {}
+        for root in tree.roots():
+            counts.update(category_counts(root.id))
+        results = [{
+            'id': node.id,
+            'name': node.name,
+            'parent_id': node.parent_id,
+            'level': node.level,
+            'breadcrumbs': tree.breadcrumbs(node.id),
+            'product_count': counts.get(node.id, (0, 0))[0],
+            'total_products': counts.get(node.id, (0, 0))[1],
+        } for node in tree.nodes.values()]
+        etag = f'"{hashlib.md5(repr(results).encode(), usedforsecurity=False).hexdigest()}"'
+        return etag, {'results': results}
+
+    return category_cache.get_or_set('menu', build)
+
+
+def _root_ids(category_ids):
+    # Ids of the top-level categories of the trees the categories are in, read from the database
+    trees = Category.objects.filter(pk__in=category_ids).values('tree_id')
+    return set(Category.objects.filter(parent=None, tree_id__in=Subquery(trees)).values_list('pk', flat=True))
+
+
+def _drop_on_commit(root_ids, tree=False):
+    # Drops the menu, the counts of the trees and optionally the tree once the transaction commits,
+    # so nothing is cached from a transaction that may still roll back
+    keys = ['menu', *(f'counts:{root_id}' for root_id in root_ids)] + (['tree'] if tree else [])
+    transaction.on_commit(lambda: category_cache.delete(*keys))
+
+
+def invalidate_category_counts():
+    # Drops the counts of every tree, for bulk writes that send no signals (imports)
+    _drop_on_commit(Category.objects.filter(parent=None).values_list('pk', flat=True))
+
+
+def category_changed(sender, instance, **kwargs):
+    # post_save/post_delete receiver of Category. Saving a node can shift the ranges of its tree and
+    # renumber the other trees, so the tree goes; only the counts of the old and new trees go with it.
+    # The old tree is the one of the parent the category was loaded with, or its own if it was a root.
+    _drop_on_commit(_root_ids([instance.pk, instance.parent_id, instance._loaded_parent_id]) | {instance.pk},
+                    tree=True)
+    instance._loaded_parent_id = instance.parent_id
+
+
+def product_saved(sender, instance, created, **kwargs):
+    # post_save receiver of Product; the counts only change when a product is added or changes category
+    if created or instance.category_id != instance._loaded_category_id:
+        _drop_on_commit(_root_ids([instance.category_id, instance._loaded_category_id]))
+    instance._loaded_category_id = instance.category_id
+
+
+def product_deleted(sender, instance, **kwargs):
+    _drop_on_commit(_root_ids([instance.category_id]))
@@ -1,6 +1,15 @@
-from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer, AsyncWebsocketConsumer
 import json
 
+from products.categories import subtree_filter
+from products.models import Category, Product
+from products.signals import category_group, product_group
+from products.snapshot import get_inventory_snapshot
+
+# Most groups (products plus categories) a single connection may follow
+MAX_SUBSCRIPTIONS = 1000
+
 
 class StockAlertConsumer(AsyncWebsocketConsumer):
     async def connect(self):
@@ -10,8 +19,74 @@ class StockAlertConsumer(AsyncWebsocketConsumer):
     async def disconnect(self, close_code):
         await self.channel_layer.group_discard("stock_alerts", self.channel_name)
 
-    async def stock_alert(self, event):
-        message = event["message"]
+    async def stock_alerts(self, event):
+        # A batch of coalesced alerts goes to the client as a single frame
         await self.send(text_data=json.dumps({
-            'message': message
+            'alerts': event["items"]
         }))
+
+
+class StockConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Stock of the products a client follows. The client sends
+    {"action": "subscribe" | "unsubscribe", "products": [ids], "categories": [ids]}; following a
+    category follows every product of its subtree. After subscribing it gets the current stock
+    of those products, then {"stock": [[product id, unreserved stock], ...]} whenever they change.
+    """
+
+    async def connect(self):
+        self.subscriptions = set()
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        for group in self.subscriptions:
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        action = content.get('action') if isinstance(content, dict) else None
+        try:
+            product_ids = {int(pk) for pk in content.get('products', [])}
+            category_ids = {int(pk) for pk in content.get('categories', [])}
+        except (AttributeError, TypeError, ValueError):
+            action = None
+        if action not in ('subscribe', 'unsubscribe'):
+            await self.send_json({'error': "Expected an action and lists of product and category ids"})
+            return
+
+        category_ids = await self.subtree(category_ids)
+        groups = {product_group(pk) for pk in product_ids} | {category_group(pk) for pk in category_ids}
+        if action == 'unsubscribe':
+            for group in groups & self.subscriptions:
+                await self.channel_layer.group_discard(group, self.channel_name)
+            self.subscriptions -= groups
+            return
+
+        groups -= self.subscriptions
+        if len(self.subscriptions) + len(groups) > MAX_SUBSCRIPTIONS:
+            await self.send_json({
+                'error': f"A connection may follow at most {MAX_SUBSCRIPTIONS} products and categories",
+            })
+            return
+        for group in groups:
+            await self.channel_layer.group_add(group, self.channel_name)
+        self.subscriptions |= groups
+        await self.send_json({'stock': await self.current_stock(product_ids, category_ids)})
+
+    @database_sync_to_async
+    def subtree(self, category_ids):
+        # Categories of the subtrees, as of subscribing; categories created afterwards are not followed
+        if not category_ids:
+            return set()
+        return set(Category.objects.filter(subtree_filter(category_ids, field=None)).values_list('pk', flat=True))
+
+    @database_sync_to_async
+    def current_stock(self, product_ids, category_ids):
+        if category_ids:
+            product_ids = product_ids | set(
+                Product.objects.filter(category_id__in=category_ids).values_list('pk', flat=True))
+        snapshot = get_inventory_snapshot()
+        return [[pk, snapshot.available(pk)] for pk in sorted(product_ids) if snapshot.get(pk) is not None]
+
+    async def stock_update(self, event):
+        # The deltas of a coalesced batch, one frame per batch
+        await self.send_json({'stock': event["items"]})
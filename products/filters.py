@@ -0,0 +1,159 @@
+from django.contrib import admin
+from django.contrib.admin.exceptions import NotRegistered
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.utils import (build_q_object_from_lookup_parameters, get_fields_from_path,
+                                       get_last_value_from_parameters)
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Count
+
+
+# Filter products by their stored stock total
+class StockListFilter(admin.SimpleListFilter):
+    title = 'stock'
+    parameter_name = 'stock'
+
+    def lookups(self, request, model_admin):
+        return (
+            ('available', 'In stock'),
+            ('out', 'Out of stock'),
+        )
+
+    def queryset(self, request, queryset):
+        if self.value() == 'available':
+            return queryset.filter(stock__gt=0)
+        if self.value() == 'out':
+            return queryset.filter(stock=0)
+        return queryset
+
+
+# Filter products by margin band, on the margin annotated by ProductQuerySet.with_margins().
+# Other ranges can be asked for in the query string, e.g. ?margin__gte=15&margin__lt=40.
+class MarginListFilter(admin.SimpleListFilter):
+    title = 'margin'
+    parameter_name = 'margin_range'
+    # Lower and upper bounds of each band, in percent of the sale price
+    bands = {
+        'loss': (None, 0),
+        '0-10': (0, 10),
+        '10-25': (10, 25),
+        '25-50': (25, 50),
+        '50+': (50, None),
+    }
+
+    def lookups(self, request, model_admin):
+        return (
+            ('loss', 'Sold at a loss'),
+            ('0-10', '0% to 10%'),
+            ('10-25', '10% to 25%'),
+            ('25-50', '25% to 50%'),
+            ('50+', '50% or more'),
+            ('none', 'No sale price'),
+        )
+
+    def queryset(self, request, queryset):
+        if self.value() == 'none':
+            return queryset.filter(margin__isnull=True)
+        if self.value() in self.bands:
+            low, high = self.bands[self.value()]
+            if low is not None:
+                queryset = queryset.filter(margin__gte=low)
+            if high is not None:
+                queryset = queryset.filter(margin__lt=high)
+        return queryset
+
+
+# The top choices of a TopRelatedListFilter are counted by refresh_top_related() (the refresh_admin_filters
+# command, run periodically) and kept this long, so a stopped job is noticed rather than served for ever
+TOP_RELATED_TIMEOUT = 24 * 3600
+
+
+def _top_related_key(model, field_path):
+    return f'admin_filters:top:{model._meta.label}:{field_path}'
+
+
+def top_related(model, field_path, limit):
+    # The `limit` related objects with the most rows of `model`, by name; one grouped query over the whole
+    # table and one lookup of names, which is why it runs outside the requests
+    related_model = get_fields_from_path(model, field_path)[-1].remote_field.model
+    counts = (model._default_manager.filter(**{f'{field_path}__isnull': False})
+              .values(field_path).annotate(rows=Count('pk')).order_by('-rows')
+              .values_list(field_path, flat=True)[:limit])
+    return sorted(((obj.pk, str(obj)) for obj in related_model._default_manager.filter(pk__in=list(counts))),
+                  key=lambda choice: choice[1])
+
+
+def refresh_top_related(admin_site=admin.site):
+    # Recounts the top choices of every TopRelatedListFilter of the site. Returns how many were refreshed.
+    refreshed = 0
+    for model, model_admin in admin_site._registry.items():
+        for list_filter in model_admin.list_filter:
+            if isinstance(list_filter, tuple) and issubclass(list_filter[1], TopRelatedListFilter):
+                field_path = list_filter[0]
+                cache.set(_top_related_key(model, field_path),
+                          top_related(model, field_path, list_filter[1].limit), timeout=TOP_RELATED_TIMEOUT)
+                refreshed += 1
+    return refreshed
+
+
+class TopRelatedListFilter(admin.RelatedFieldListFilter):
+    """
+    Related filter that lists the `limit` related objects with the most rows, plus the selected
+    one, instead of the whole related table. Its search box lists the related objects matching a
+    term instead, found through the search of the related ModelAdmin. The sidebar costs the same
+    however many related objects there are: the top objects are counted outside the requests by
+    refresh_top_related(), until then the first `limit` related objects are listed.
+    """
+    template = 'products/admin/top_related_filter.html'
+    limit = 20
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        # field_choices() runs within the parent __init__, so the term is read first
+        self.search_parameter = f'{field_path}__search'
+        self.search_term = (get_last_value_from_parameters(params, self.search_parameter) or '').strip()
+        super().__init__(field, request, params, model, model_admin, field_path)
+
+    def expected_parameters(self):
+        return [*super().expected_parameters(), self.search_parameter]
+
+    def has_output(self):
+        # Stays visible with no choices, so a search that found nothing can be changed
+        return True
+
+    def queryset(self, request, queryset):
+        # The search term only changes the listed choices, the rows are filtered by the chosen object
+        lookups = {key: value for key, value in self.used_parameters.items() if key != self.search_parameter}
+        try:
+            return queryset.filter(build_q_object_from_lookup_parameters(lookups))
+        except (ValueError, ValidationError) as error:
+            raise IncorrectLookupParameters(error)
+
+    def field_choices(self, field, request, model_admin):
+        related_model = field.remote_field.model
+        if self.search_term:
+            choices = self._search(related_model, request, model_admin)
+        else:
+            choices = cache.get(_top_related_key(model_admin.model, self.field_path))
+            if choices is None:
+                choices = sorted(((obj.pk, str(obj)) for obj in related_model._default_manager.all()[:self.limit]),
+                                 key=lambda choice: choice[1])
+        listed = {str(pk) for pk, _ in choices}
+        missing = [value for value in self.lookup_val or () if value not in listed]
+        if missing:
+            try:
+                selected = related_model._default_manager.filter(pk__in=missing)
+                choices = choices + [(obj.pk, str(obj)) for obj in selected]
+            except (ValueError, ValidationError):
+                # A malformed id, reported by queryset() like any other bad lookup
+                pass
+        return choices
+
+    def _search(self, related_model, request, model_admin):
+        try:
+            related_admin = model_admin.admin_site.get_model_admin(related_model)
+        except NotRegistered:
+            matches = related_model._default_manager.filter(name__icontains=self.search_term)
+        else:
+            matches, _ = related_admin.get_search_results(request, related_admin.get_queryset(request),
+                                                          self.search_term)
+        return [(obj.pk, str(obj)) for obj in matches[:self.limit]]
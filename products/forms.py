@@ -1,6 +1,9 @@
 from django import forms
 
+from products.categories import subtree_filter
 from products.models import Category, Supplier, Product
+from products.search import search_products
+from products.widgets import ProductAutocompleteInput
 
 
 class ProductForm(forms.ModelForm):
@@ -14,6 +17,18 @@ class ProductForm(forms.ModelForm):
 
 
 class ProductSearchForm(forms.Form):
-    name = forms.CharField(required=False)
+    name = forms.CharField(required=False, widget=ProductAutocompleteInput())
     category = forms.ModelChoiceField(queryset=Category.objects.all(), required=False)
     supplier = forms.ModelChoiceField(queryset=Supplier.objects.all(), required=False)
+
+    def filter_queryset(self, queryset):
+        # Applies the cleaned search criteria to a product queryset
+        data = self.cleaned_data
+        if data.get('category'):
+            # The category and its subcategories
+            queryset = queryset.filter(subtree_filter([data['category'].pk]))
+        if data.get('supplier'):
+            queryset = queryset.filter(supplier=data['supplier'])
+        if data.get('name'):
+            queryset = search_products(queryset, data['name']).order_by('-search_rank', 'name')
+        return queryset
@@ -0,0 +1,53 @@
+from django.db import transaction
+from django.db.models import F, OuterRef, Q, Subquery, Sum
+
+from products.models import InventoryMovement, StockSnapshot
+
+
+def _last_snapshot(at):
+    # The most recent snapshot of the outer row's product taken at or before `at`
+    return StockSnapshot.objects.filter(product=OuterRef('product'), taken_at__lte=at).order_by('-taken_at')
+
+
+def stock_as_of(product_id, when):
+    """
+    Stock of a product at a moment: its last snapshot up to then plus the movements after it.
+    Movements folded away by compact() are only reflected at the moments of the snapshots.
+    """
+    snapshot = (StockSnapshot.objects.filter(product_id=product_id, taken_at__lte=when)
+                .order_by('-taken_at').values_list('taken_at', 'stock').first())
+    movements = InventoryMovement.objects.filter(product_id=product_id, created_at__lte=when)
+    if snapshot is not None:
+        movements = movements.filter(created_at__gt=snapshot[0])
+    return (snapshot[1] if snapshot else 0) + (movements.aggregate(total=Sum('quantity'))['total'] or 0)
+
+
+def take_snapshots(at):
+    """
+    Snapshots, as of `at`, every product whose stock moved since its previous snapshot,
+    in three queries whatever the number of products. Returns how many were taken.
+    """
+    previous = {
+        product_id: stock for product_id, stock in StockSnapshot.objects.filter(
+            taken_at=Subquery(_last_snapshot(at).values('taken_at')[:1])).values_list('product_id', 'stock')
+    }
+    moved = (InventoryMovement.objects.filter(created_at__lte=at)
+             .annotate(since=Subquery(_last_snapshot(at).values('taken_at')[:1]))
+             .filter(Q(since__isnull=True) | Q(created_at__gt=F('since')))
+             .values('product_id').annotate(total=Sum('quantity')).values_list('product_id', 'total').order_by())
+    snapshots = StockSnapshot.objects.bulk_create([
+        StockSnapshot(product_id=product_id, taken_at=at, stock=previous.get(product_id, 0) + total)
+        for product_id, total in moved
+    ], ignore_conflicts=True)
+    return len(snapshots)
+
+
+def compact(before):
+    """
+    Folds the movements up to `before` into snapshots taken at that moment and deletes them,
+    so the ledger only keeps recent history. Returns the number of movements deleted.
+    """
+    with transaction.atomic():
+        take_snapshots(before)
+        deleted, _ = InventoryMovement.objects.filter(created_at__lte=before).delete()
+    return deleted
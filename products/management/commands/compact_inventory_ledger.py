@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from products.ledger import compact, take_snapshots
+
+
+class Command(BaseCommand):
+    help = "Snapshots the stock of the products that moved and folds old ledger movements into snapshots"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-days', type=int, default=90,
+                            help="Days of movements kept; older ones are folded into snapshots")
+        parser.add_argument('--margin', type=int, default=300,
+                            help="Seconds left out of the new snapshots, for transactions still in flight")
+
+    def handle(self, *args, **options):
+        # Run it periodically (e.g. daily) so stock as of any date only scans the movements after a recent snapshot
+        now = timezone.now()
+        taken = take_snapshots(now - timedelta(seconds=options['margin']))
+        deleted = compact(now - timedelta(days=options['keep_days']))
+        self.stdout.write(self.style.SUCCESS(f"{taken} stock snapshots taken, {deleted} movements compacted"))
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from products.resources import CHUNK_SIZE, stream_import
+
+
+class Command(BaseCommand):
+    help = "Imports a product catalog file in chunks, with bulk writes and a dry-run diff"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or XLSX file in the format of the product export")
+        parser.add_argument('--format', choices=['csv', 'xlsx'],
+                            help="File format; taken from the file extension when not given")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help="Rows read and written together")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Report what would change without writing anything")
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or ('xlsx' if options['path'].lower().endswith('.xlsx') else 'csv')
+        totals = {'new': 0, 'update': 0, 'skip': 0, 'errors': 0}
+        with open(options['path'], 'rb') as file:
+            for chunk in stream_import(file, file_format, options['chunk_size'], options['dry_run']):
+                if options['dry_run']:
+                    self._write_changes(chunk.changes)
+                for row, message in chunk.errors:
+                    self.stderr.write(f"Row {row}: {message}" if row else message)
+                totals['new'] += chunk.totals['new']
+                totals['update'] += chunk.totals['update']
+                totals['skip'] += chunk.totals['skip']
+                totals['errors'] += len(chunk.errors)
+                self.stdout.write(
+                    f"Rows {chunk.first_row}-{chunk.first_row + chunk.rows - 1}: {chunk.totals['new']} new, "
+                    f"{chunk.totals['update']} updated, {chunk.totals['skip']} unchanged, {len(chunk.errors)} errors"
+                    + (" (rolled back)" if chunk.errors and not options['dry_run'] else "")
+                )
+        summary = (f"{totals['new']} new, {totals['update']} updated, {totals['skip']} unchanged, "
+                   f"{totals['errors']} errors" + (" (dry run, nothing written)" if options['dry_run'] else ""))
+        self.stdout.write(self.style.ERROR(summary) if totals['errors'] else self.style.SUCCESS(summary))
+
+    def _write_changes(self, changes):
+        for row, pk, name, changed in changes:
+            if pk is None:
+                self.stdout.write(f"+ row {row}: {name}")
+                continue
+            self.stdout.write(f"~ row {row}: #{pk} {name}")
+            for field, (old, new) in changed.items():
+                self.stdout.write(f"    {field}: {old} -> {new}")
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from products.models import Product, Inventory
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the stored product stock and reserved totals from the inventories"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only report the products whose stored stock is out of date")
+
+    def handle(self, *args, **options):
+        inventories = Inventory.objects.filter(product=OuterRef('pk')).values('product')
+        with transaction.atomic():
+            drifted = Product.objects.select_for_update().annotate(
+                inventory_stock=Coalesce(Subquery(inventories.annotate(total=Sum('current_stock')).values('total')), 0),
+                inventory_reserved=Coalesce(
+                    Subquery(inventories.annotate(total=Sum('reserved_stock')).values('total')), 0),
+            ).filter(~Q(stock=F('inventory_stock')) | ~Q(reserved_stock=F('inventory_reserved')))
+            drifted_ids = list(drifted.values_list('pk', flat=True))
+
+            if options['dry_run']:
+                self.stdout.write(f"{len(drifted_ids)} products have an out of date stock total")
+                return
+
+            Product.objects.filter(pk__in=drifted_ids).sync_stock()
+
+        self.stdout.write(self.style.SUCCESS(f"Stock total rebuilt for {len(drifted_ids)} products"))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from products.filters import refresh_top_related
+
+
+class Command(BaseCommand):
+    help = "Recounts the top related objects listed by the admin changelist filters"
+
+    def handle(self, *args, **options):
+        # Run it periodically (e.g. every 10 minutes); the changelists only read what it stores
+        refreshed = refresh_top_related()
+        self.stdout.write(self.style.SUCCESS(f"{refreshed} admin filters refreshed"))
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.14 on 2026-10-18 17:52
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def populate_stock(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    Inventory = apps.get_model('products', 'Inventory')
+    inventory_total = Inventory.objects.filter(product=OuterRef('pk')).values('product').annotate(
+        total=Sum('current_stock')).values('total')
+    Product.objects.update(stock=Coalesce(Subquery(inventory_total), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_productissue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='stock',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, help_text='Total stock of the product'),
+        ),
+        migrations.RunPython(populate_stock, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.14 on 2026-10-18 17:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_product_stock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventory',
+            name='reserved_stock',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Stock reserved by pending sales'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='reserved_stock',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Stock reserved by pending sales'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.0.14 on 2026-10-18 19:05
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# Search indexes and the trigger that maintains Products.search_vector; they only exist on Postgres
+SEARCH_SQL = """
+CREATE INDEX products_search_vector_gin ON "Products" USING gin (search_vector);
+CREATE INDEX products_name_trgm ON "Products" USING gin (name gin_trgm_ops);
+CREATE INDEX categories_name_trgm ON "Categories" USING gin (name gin_trgm_ops);
+CREATE INDEX suppliers_name_trgm ON "Suppliers" USING gin (name gin_trgm_ops);
+
+CREATE FUNCTION products_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER products_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, description ON "Products"
+    FOR EACH ROW EXECUTE FUNCTION products_search_vector_update();
+
+UPDATE "Products" SET search_vector =
+    setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(description, '')), 'B');
+"""
+
+REVERSE_SEARCH_SQL = """
+DROP TRIGGER IF EXISTS products_search_vector_trigger ON "Products";
+DROP FUNCTION IF EXISTS products_search_vector_update();
+DROP INDEX IF EXISTS products_search_vector_gin;
+DROP INDEX IF EXISTS products_name_trgm;
+DROP INDEX IF EXISTS categories_name_trgm;
+DROP INDEX IF EXISTS suppliers_name_trgm;
+"""
+
+
+def create_search_objects(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(SEARCH_SQL)
+
+
+def drop_search_objects(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(REVERSE_SEARCH_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0015_inventory_reserved_stock_product_reserved_stock'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_objects, drop_search_objects),
+    ]
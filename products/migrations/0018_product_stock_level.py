@@ -0,0 +1,37 @@
+# Generated by Django 5.0.14 on 2026-10-18 18:06
+
+from django.db import migrations, models
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThan
+
+
+def populate_stock_level(apps, schema_editor):
+    # Existing products start at their current level, so the first alerts are real crossings
+    Product = apps.get_model('products', 'Product')
+    Inventory = apps.get_model('products', 'Inventory')
+    inventories = Inventory.objects.filter(product=OuterRef('pk')).values('product')
+    min_total = Coalesce(Subquery(inventories.annotate(total=Sum('min_stock')).values('total')), 0)
+    max_total = Coalesce(Subquery(inventories.annotate(total=Sum('max_stock')).values('total')), 0)
+    Product.objects.update(stock_level=Case(
+        When(stock__lte=F('reserved_stock'), then=Value('out')),
+        When(stock__lte=F('reserved_stock') + min_total, then=Value('low')),
+        When(GreaterThan(max_total, 0) & GreaterThan(F('stock'), F('reserved_stock') + max_total), then=Value('over')),
+        default=Value('normal'),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0017_product_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='stock_level',
+            field=models.CharField(choices=[('out', 'Out of stock'), ('low', 'Low'), ('normal', 'Normal'), ('over', 'Overstocked')], default='normal', editable=False, max_length=10),
+        ),
+        migrations.RunPython(populate_stock_level, migrations.RunPython.noop),
+    ]
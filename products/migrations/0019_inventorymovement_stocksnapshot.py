@@ -0,0 +1,63 @@
+# Generated by Django 5.0.14 on 2026-10-18 18:13
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def snapshot_current_stock(apps, schema_editor):
+    # The ledger starts from the stock of today; history before it is unknown
+    Product = apps.get_model('products', 'Product')
+    StockSnapshot = apps.get_model('products', 'StockSnapshot')
+    now = django.utils.timezone.now()
+    StockSnapshot.objects.bulk_create([
+        StockSnapshot(product_id=product_id, taken_at=now, stock=stock)
+        for product_id, stock in Product.objects.filter(stock__gt=0).values_list('pk', 'stock').iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0018_product_stock_level'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField()),
+                ('stock', models.IntegerField(help_text='Stock of the product at that moment')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'stock snapshot',
+                'verbose_name_plural': 'stock snapshots',
+                'db_table': 'StockSnapshots',
+            },
+        ),
+        migrations.CreateModel(
+            name='InventoryMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(help_text='Units added to or taken from the stock')),
+                ('reason', models.CharField(choices=[('sale', 'Sale'), ('purchase', 'Purchase'), ('return', 'Return'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('reference_id', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('inventory', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movements', to='products.inventory')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'inventory movement',
+                'verbose_name_plural': 'inventory movements',
+                'db_table': 'InventoryMovements',
+                'indexes': [models.Index(fields=['product', 'created_at'], name='movements_product_created_idx'), models.Index(fields=['created_at'], name='movements_created_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='stocksnapshot',
+            constraint=models.UniqueConstraint(fields=('product', 'taken_at'), name='unique_product_stock_snapshot'),
+        ),
+        migrations.RunPython(snapshot_current_stock, migrations.RunPython.noop),
+    ]
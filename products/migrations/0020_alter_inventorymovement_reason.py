@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 18:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0019_inventorymovement_stocksnapshot'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='inventorymovement',
+            name='reason',
+            field=models.CharField(choices=[('sale', 'Sale'), ('purchase', 'Purchase'), ('return', 'Return'), ('cancellation', 'Sale cancellation'), ('adjustment', 'Adjustment')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 18:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0020_alter_inventorymovement_reason'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productissue',
+            name='quantity',
+            field=models.PositiveIntegerField(default=0, help_text='Units affected by the issue'),
+        ),
+    ]
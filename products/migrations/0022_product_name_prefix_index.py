@@ -0,0 +1,27 @@
+from django.db import migrations
+
+# Index behind the case-insensitive prefix matches of the product autocomplete (name__istartswith).
+# text_pattern_ops lets LIKE 'ABC%' use it whatever the collation; it only exists on Postgres.
+PREFIX_INDEX_SQL = 'CREATE INDEX products_name_upper_prefix ON "Products" (UPPER(name::text) text_pattern_ops);'
+REVERSE_PREFIX_INDEX_SQL = 'DROP INDEX IF EXISTS products_name_upper_prefix;'
+
+
+def create_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(PREFIX_INDEX_SQL)
+
+
+def drop_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(REVERSE_PREFIX_INDEX_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0021_productissue_quantity'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_prefix_index, drop_prefix_index),
+    ]
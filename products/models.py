@@ -1,4 +1,8 @@
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Round
+from django.utils import timezone
 from django_extensions.db.fields import AutoSlugField
 from mptt.models import MPTTModel, TreeForeignKey
 
@@ -19,9 +23,22 @@ class Category(MPTTModel):
         verbose_name = "category"
         verbose_name_plural = "categories"
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Parent the row was loaded with, so moving a category also recounts its old tree (see categories.py)
+        self._loaded_parent_id = self.__dict__.get('parent_id')
+        self._loaded_name = self.__dict__.get('name')
+
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # The catalog shows the category name with its products, so renaming it refreshes their modification date
+        if self._loaded_name is not None and self.name != self._loaded_name:
+            Product.objects.filter(category=self).update(updated_at=timezone.now())
+        self._loaded_name = self.name
+
 
 # Model for suppliers
 class Supplier(models.Model):
@@ -47,8 +64,55 @@ class Supplier(models.Model):
         db_table = "Suppliers"
 
 
+class ProductQuerySet(models.QuerySet):
+    def sync_stock(self):
+        # Rebuilds the stored stock and reserved totals from the inventories in a single UPDATE.
+        inventories = Inventory.objects.filter(product=OuterRef('pk')).values('product')
+        rows = self.update(
+            stock=Coalesce(Subquery(inventories.annotate(total=Sum('current_stock')).values('total')), 0),
+            reserved_stock=Coalesce(Subquery(inventories.annotate(total=Sum('reserved_stock')).values('total')), 0),
+            updated_at=timezone.now(),
+        )
+        # Every stock write ends here, so this is where threshold crossings are detected
+        from products.alerts import detect_crossings
+        detect_crossings(self)
+        return rows
+
+    def with_stock_level(self):
+        # Annotates the thresholds summed over the inventories and the stock level the unreserved stock is at.
+        return self.annotate(
+            min_total=Coalesce(Sum('inventories__min_stock'), 0),
+            max_total=Coalesce(Sum('inventories__max_stock'), 0),
+        ).annotate(level=Case(
+            When(stock__lte=F('reserved_stock'), then=Value('out')),
+            When(stock__lte=F('reserved_stock') + F('min_total'), then=Value('low')),
+            When(Q(max_total__gt=0) & Q(stock__gt=F('reserved_stock') + F('max_total')), then=Value('over')),
+            default=Value('normal'),
+        ))
+
+    def with_margins(self):
+        # Annotates the unit profit, the margin (% of the sale price) and the markup (% of the purchase price).
+        # A margin without sale price or a markup without purchase price is NULL rather than a division by zero.
+        percentage = DecimalField(max_digits=12, decimal_places=2)
+        profit = (F('sale_price') - F('purchase_price')) * 100
+        return self.annotate(
+            unit_profit=F('sale_price') - F('purchase_price'),
+            margin=Case(When(sale_price__gt=0,
+                             then=Round(profit / F('sale_price'), 2, output_field=percentage))),
+            markup=Case(When(purchase_price__gt=0,
+                             then=Round(profit / F('purchase_price'), 2, output_field=percentage))),
+        )
+
+
 # Model for products
 class Product(models.Model):
+    STOCK_LEVELS = [
+        ('out', 'Out of stock'),
+        ('low', 'Low'),
+        ('normal', 'Normal'),
+        ('over', 'Overstocked'),
+    ]
+
     # Product category
     category = models.ForeignKey(Category, on_delete=models.RESTRICT, related_name='products',
                                  help_text="Product Category", db_index=True)
@@ -65,31 +129,57 @@ class Product(models.Model):
     # Sales price of the product
     sale_price = models.DecimalField(default=0.00, blank=True, max_digits=10, decimal_places=2,
                                      help_text="Product sale price")
-    # Unique slug for product URL
-    slug = AutoSlugField(populate_from='name', unique=True)
+    # Unique slug for product URL, kept when it is already set (bulk imports generate theirs)
+    slug = AutoSlugField(populate_from='name', unique=True, overwrite_on_add=False)
     # Product creation date
     created_at = models.DateTimeField(auto_now_add=True)
+    # Last change of the product or its variations
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     # Product image
     image = models.ImageField(upload_to='products/', blank=True, null=True)
+    # Total stock across all inventories, maintained together with every inventory write
+    stock = models.PositiveIntegerField(default=0, editable=False, db_index=True,
+                                        help_text="Total stock of the product")
+    # Units held by pending sales, maintained together with the inventory reservations
+    reserved_stock = models.PositiveIntegerField(default=0, editable=False,
+                                                 help_text="Stock reserved by pending sales")
+    # Stock level of the last alert raised for the product, so alerts only fire when it changes
+    stock_level = models.CharField(max_length=10, choices=STOCK_LEVELS, default='normal', editable=False)
+    # Full-text document of name and description, kept up to date by a database trigger on Postgres
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = ProductQuerySet.as_manager()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Category the row was loaded with, so moving a product also recounts the old category (see categories.py).
+        # Read from __dict__, a deferred category_id is not loaded for it.
+        self._loaded_category_id = self.__dict__.get('category_id')
 
     def __str__(self):
         return self.name
 
     @property
-    def stock(self):
-        return sum(inventory.current_stock for inventory in self.inventories.all())
+    def available_stock(self):
+        # Stock that can still be sold once the pending sales are served
+        return self.stock - self.reserved_stock
 
     @property
     def profit_margin(self):
+        # Same margin as ProductQuerySet.with_margins(), for a single product already loaded
         if self.sale_price > 0:
-            return ((self.purchase_price - self.sale_price) / self.purchase_price) * 100
-        return 0
+            return round((self.sale_price - self.purchase_price) * 100 / self.sale_price, 2)
+        return None
 
     class Meta:
         ordering = ['name', 'category']
         verbose_name = 'product'
         verbose_name_plural = 'products'
         db_table = "Products"
+        indexes = [
+            # Keyset pagination of the catalog walks (name, id)
+            models.Index(fields=['name', 'id'], name='products_name_id_idx'),
+        ]
 
 
 # Model for product variations
@@ -115,26 +205,157 @@ class Variation(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Variations are part of the product in the catalog, so they refresh its modification date
+        Product.objects.filter(pk=self.product_id).update(updated_at=timezone.now())
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        Product.objects.filter(pk=self.product_id).update(updated_at=timezone.now())
+        return result
+
     class Meta:
         db_table = "Variations"
 
 
+class InventoryQuerySet(models.QuerySet):
+    # Queryset writes keep the product stock totals in step, as Inventory.save() does.
+    # Stock changed through update() is not written to the ledger; products.stock records its own movements.
+    def update(self, **kwargs):
+        with transaction.atomic(savepoint=False):
+            product_ids = set(self.values_list('product_id', flat=True))
+            rows = super().update(**kwargs)
+            Product.objects.filter(pk__in=product_ids).sync_stock()
+        return rows
+
+    def delete(self):
+        with transaction.atomic(savepoint=False):
+            removed = list(self.values_list('pk', 'product_id', 'current_stock'))
+            result = super().delete()
+            InventoryMovement.objects.bulk_create([
+                InventoryMovement(product_id=product_id, quantity=-current_stock, reason='adjustment')
+                for _, product_id, current_stock in removed if current_stock
+            ])
+            Product.objects.filter(pk__in={product_id for _, product_id, _ in removed}).sync_stock()
+        return result
+
+
 class Inventory(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='inventories')
     current_stock = models.PositiveIntegerField(default=0, help_text="Available stock of the product")
+    reserved_stock = models.PositiveIntegerField(default=0, editable=False,
+                                                 help_text="Stock reserved by pending sales")
     min_stock = models.PositiveIntegerField(default=0, help_text="Minimum stock of the product")
     max_stock = models.PositiveIntegerField(default=0, help_text="Maximum stock of the product")
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = InventoryQuerySet.as_manager()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Product the row was loaded with, so moving an inventory also refreshes the old product.
+        # Read from __dict__, a deferred product_id would cost a query per row (e.g. in the delete collector).
+        self._loaded_product_id = self.__dict__.get('product_id')
+
     def __str__(self):
         return f"{self.product.name} - {self.current_stock}"
 
+    def _stored(self):
+        # Product and stock the row holds in the database, locked until the transaction ends
+        return Inventory.objects.select_for_update().filter(pk=self.pk).values_list(
+            'product_id', 'current_stock').first()
+
+    def _adjustments(self, stored):
+        # Ledger movements of a direct edit: the stock leaves the stored product and enters the new one
+        if stored is None:
+            moves = [(self.product_id, self.current_stock)]
+        elif stored[0] == self.product_id:
+            moves = [(self.product_id, self.current_stock - stored[1])]
+        else:
+            moves = [(stored[0], -stored[1]), (self.product_id, self.current_stock)]
+        return [InventoryMovement(product_id=product_id, inventory=self, quantity=quantity, reason='adjustment')
+                for product_id, quantity in moves if quantity]
+
+    def save(self, *args, **kwargs):
+        # The product stock total and the ledger change in the same transaction as the inventory row
+        with transaction.atomic(savepoint=False):
+            stored = None if self._state.adding else self._stored()
+            super().save(*args, **kwargs)
+            InventoryMovement.objects.bulk_create(self._adjustments(stored))
+            # The stored row knows the old product even when the instance was loaded without it
+            old_product_id = stored[0] if stored else self._loaded_product_id
+            Product.objects.filter(pk__in={self.product_id, old_product_id}).sync_stock()
+        self._loaded_product_id = self.product_id
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            stored = self._stored()
+            result = super().delete(*args, **kwargs)
+            if stored and stored[1]:
+                InventoryMovement.objects.create(product_id=stored[0], quantity=-stored[1], reason='adjustment')
+            Product.objects.filter(pk=self._loaded_product_id).sync_stock()
+        return result
+
     class Meta:
         db_table = "Inventories"
         verbose_name = "inventory"
         verbose_name_plural = "inventories"
 
 
+# Append-only record of every stock change, the history behind Inventory.current_stock
+class InventoryMovement(models.Model):
+    REASONS = [
+        ('sale', 'Sale'),
+        ('purchase', 'Purchase'),
+        ('return', 'Return'),
+        ('cancellation', 'Sale cancellation'),
+        ('adjustment', 'Adjustment'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='movements')
+    # Inventory row that moved, kept empty once the row is deleted
+    inventory = models.ForeignKey(Inventory, on_delete=models.SET_NULL, null=True, blank=True,
+                                  related_name='movements')
+    # Units that entered (positive) or left (negative) the stock
+    quantity = models.IntegerField(help_text="Units added to or taken from the stock")
+    reason = models.CharField(max_length=20, choices=REASONS)
+    # Id of the sale, purchase or return behind the movement, depending on the reason; empty for bulk changes
+    reference_id = models.PositiveBigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.product_id} {self.quantity:+} ({self.reason})"
+
+    class Meta:
+        db_table = "InventoryMovements"
+        verbose_name = "inventory movement"
+        verbose_name_plural = "inventory movements"
+        indexes = [
+            # Stock as of a date scans the movements of one product after its last snapshot
+            models.Index(fields=['product', 'created_at'], name='movements_product_created_idx'),
+            models.Index(fields=['created_at'], name='movements_created_idx'),
+        ]
+
+
+# Stock of a product at a moment, folded from the movements up to then (see products/ledger.py)
+class StockSnapshot(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_snapshots')
+    taken_at = models.DateTimeField()
+    stock = models.IntegerField(help_text="Stock of the product at that moment")
+
+    def __str__(self):
+        return f"{self.product_id} - {self.taken_at} - {self.stock}"
+
+    class Meta:
+        db_table = "StockSnapshots"
+        verbose_name = "stock snapshot"
+        verbose_name_plural = "stock snapshots"
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'taken_at'], name='unique_product_stock_snapshot'),
+        ]
+
+
 class ProductIssue(models.Model):
     PRODUCT_ISSUE_TYPES = [
         ('default', 'Default'),
@@ -144,6 +365,8 @@ class ProductIssue(models.Model):
 
     product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='issue')
     issue_type = models.CharField(max_length=20, choices=PRODUCT_ISSUE_TYPES, default='default')
+    # Units set apart because of the issue, such as damaged returns, which are not in the stock
+    quantity = models.PositiveIntegerField(default=0, help_text="Units affected by the issue")
     notes = models.TextField(blank=True, null=True, help_text="Additional details about the issue")
 
     def __str__(self):
@@ -0,0 +1,55 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+# Filtered changelists count at most this many rows and show "10,000+" beyond it
+COUNT_CAP = 10000
+# Unfiltered tables the planner estimates below this many rows are still counted exactly
+ESTIMATE_THRESHOLD = 100000
+
+
+def estimated_rows(model, using='default'):
+    # Row count of a model's table from the planner statistics (Postgres), None when there are none
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)",
+                       [connection.ops.quote_name(model._meta.db_table)])
+        row = cursor.fetchone()
+    # reltuples is -1 until the table is first vacuumed or analyzed
+    return row[0] if row and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for changelists of large tables. An unfiltered queryset takes its count from the
+    planner statistics instead of COUNT(*), and a filtered one stops counting at COUNT_CAP rows.
+    `count_display` tells which, for the pagination template: "~1,234,567", "10,000+" or None
+    when the count is exact. Pair it with show_full_result_count = False, which drops the
+    second, unfiltered count of the changelist.
+    """
+    estimated = False
+    capped = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_rows(queryset.model, queryset.db)
+            if estimate is not None and estimate >= ESTIMATE_THRESHOLD:
+                self.estimated = True
+                return estimate
+            return queryset.count()
+        # Counting stops after COUNT_CAP + 1 rows, and the ordering is not needed to count them
+        count = queryset.order_by()[:COUNT_CAP + 1].count()
+        self.capped = count > COUNT_CAP
+        return count
+
+    @property
+    def count_display(self):
+        if self.estimated:
+            return f"~{self.count:,}"
+        if self.capped:
+            return f"{COUNT_CAP:,}+"
+        return None
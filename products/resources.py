@@ -1,7 +1,197 @@
-from import_export import resources
-from .models import Product
+import csv
+import io
+from collections import defaultdict, namedtuple
+from functools import reduce
+from itertools import count, islice
+from operator import or_
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.text import slugify
+from import_export import fields, resources, widgets
+from import_export.instance_loaders import CachedInstanceLoader
+from tablib import Dataset
+
+from .autocomplete import invalidate_autocomplete
+from .categories import invalidate_category_counts
+from .models import Category, Product, Supplier
+
+# Rows read, imported and written together; memory stays the same whatever the size of the file
+CHUNK_SIZE = 1000
+# Slug prefixes looked up by each query, under the expression limit of every backend
+SLUG_LOOKUP_SIZE = 200
+
+# Outcome of one chunk of a streaming import. `changes` holds (row, product id, name, {field: (old, new)})
+# for the new and changed rows, `errors` holds (row, message).
+ChunkResult = namedtuple('ChunkResult', ['first_row', 'rows', 'totals', 'changes', 'errors'])
+
+
+class PreloadedForeignKeyWidget(widgets.ForeignKeyWidget):
+    # Resolves the keys through a map of the whole table, loaded on first use, instead of a query per row
+    def __init__(self, model, field='pk', **kwargs):
+        super().__init__(model, field, **kwargs)
+        self.keys = None
+
+    def clean(self, value, row=None, **kwargs):
+        if value is None or value == '':
+            return None
+        if self.keys is None:
+            self.keys = {str(key): pk for key, pk in self.model.objects.values_list(self.field, 'pk')}
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        try:
+            return self.model(pk=self.keys[str(value)])
+        except KeyError:
+            raise ValueError(f"{self.model._meta.verbose_name} {value} does not exist")
 
 
 class ProductResource(resources.ModelResource):
+    category = fields.Field(attribute='category', column_name='category',
+                            widget=PreloadedForeignKeyWidget(Category))
+    supplier = fields.Field(attribute='supplier', column_name='supplier',
+                            widget=PreloadedForeignKeyWidget(Supplier))
+    # Slugs are generated for the new products and the stock comes from the inventories, neither is imported
+    slug = fields.Field(attribute='slug', column_name='slug', readonly=True)
+    stock = fields.Field(attribute='stock', column_name='stock', readonly=True)
+
     class Meta:
         model = Product
+        fields = ('id', 'name', 'description', 'category', 'supplier', 'purchase_price', 'sale_price', 'slug', 'stock')
+        # Existing products of each batch are read with one query and saved with bulk_create/bulk_update
+        instance_loader_class = CachedInstanceLoader
+        use_bulk = True
+        batch_size = CHUNK_SIZE
+        skip_unchanged = True
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # New and changed rows of the current import, in the format of ChunkResult.changes
+        self.changes = []
+        self.row_changed = False
+        # Fields changed by each existing product waiting in update_instances
+        self.changed_fields = {}
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('category', 'supplier')
+
+    def _imported_fields(self):
+        # Model fields written by an import, the id aside
+        return [Product._meta.get_field(field.attribute)
+                for field in self.get_import_fields() if not field.readonly and field.attribute != 'id']
+
+    def import_instance(self, instance, row, **kwargs):
+        imported = self._imported_fields()
+        before = [getattr(instance, field.attname) for field in imported]
+        super().import_instance(instance, row, **kwargs)
+        changed = {field.name: (old, getattr(instance, field.attname))
+                   for field, old in zip(imported, before) if old != getattr(instance, field.attname)}
+        # Rows are imported one at a time, skip_row() of the same row reads it next
+        self.row_changed = bool(changed)
+        if instance.pk is not None:
+            # A product repeated in the batch is the same instance, its changes add up
+            self.changed_fields.setdefault(instance.pk, set()).update(changed)
+        if instance.pk is None or changed:
+            self.changes.append((kwargs.get('row_number'), instance.pk, instance.name, changed))
+
+    def skip_row(self, instance, original, row, import_validation_errors=None):
+        # Unchanged rows are told apart by the field values compared on import, which needs no copy of the product
+        if not self._meta.skip_unchanged or import_validation_errors:
+            return False
+        return instance.pk is not None and not self.row_changed
+
+    def bulk_create(self, *args, **kwargs):
+        assign_slugs(self.create_instances)
+        return super().bulk_create(*args, **kwargs)
+
+    def after_import(self, dataset, result, **kwargs):
+        super().after_import(dataset, result, **kwargs)
+        # Bulk writes send no post_save, the autocomplete names and prices and the category counts are dropped here
+        if not kwargs.get('dry_run'):
+            invalidate_autocomplete(Product)
+            invalidate_category_counts()
+
+    def bulk_update(self, using_transactions, dry_run, raise_errors, batch_size=None, result=None):
+        # Products are written grouped by the fields they change, so each UPDATE only sets those columns.
+        # bulk_update() skips auto_now, and the inventory snapshot finds changed products by updated_at.
+        if self.update_instances and (using_transactions or not dry_run):
+            now = timezone.now()
+            groups = defaultdict(list)
+            for instance in self.update_instances:
+                instance.updated_at = now
+                groups[tuple(sorted(self.changed_fields.pop(instance.pk, ())))].append(instance)
+            try:
+                for changed, instances in groups.items():
+                    Product.objects.bulk_update(instances, [*changed, 'updated_at'], batch_size=batch_size)
+            except Exception as e:
+                self.handle_import_error(result, e, raise_errors)
+            finally:
+                self.update_instances.clear()
+        self.changed_fields.clear()
+
+
+class CatalogImportResource(ProductResource):
+    # Streaming imports report the changes recorded on import, without the copy and diff of every row
+    class Meta(ProductResource.Meta):
+        skip_diff = True
+
+
+def _slug_candidates(base, max_length):
+    # The slugs AutoSlugField would try for a name, in order: base, base-2, base-3...
+    yield base
+    for number in count(2):
+        end = f'-{number}'
+        yield base[:max_length - len(end)].strip('-') + end
+
+
+def assign_slugs(products):
+    """
+    Gives the new products unique slugs the way AutoSlugField does, with one query per
+    SLUG_LOOKUP_SIZE names for the slugs already taken instead of one per candidate.
+    """
+    max_length = Product._meta.get_field('slug').max_length
+    bases = [(product, slugify(product.name)[:max_length].strip('-')) for product in products if not product.slug]
+    # Every candidate of a base starts with its first max_length - 6 characters (room for "-99999")
+    prefixes = sorted({base[:max_length - 6] for _, base in bases})
+    taken = set()
+    for start in range(0, len(prefixes), SLUG_LOOKUP_SIZE):
+        lookup = reduce(or_, (Q(slug__startswith=prefix) for prefix in prefixes[start:start + SLUG_LOOKUP_SIZE]))
+        taken.update(Product.objects.filter(lookup).values_list('slug', flat=True))
+    for product, base in bases:
+        product.slug = next(slug for slug in _slug_candidates(base, max_length) if slug not in taken)
+        taken.add(product.slug)
+
+
+def _read_rows(file, file_format):
+    # Headers and a lazy iterator over the rows of a CSV or XLSX file
+    if file_format == 'xlsx':
+        from openpyxl import load_workbook
+        rows = load_workbook(file, read_only=True, data_only=True).active.iter_rows(values_only=True)
+    else:
+        text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='') if isinstance(file.read(0), bytes) else file
+        rows = csv.reader(text)
+    return next(rows, ()), rows
+
+
+def stream_import(file, file_format='csv', chunk_size=CHUNK_SIZE, dry_run=False):
+    """
+    Imports a product catalog a chunk of rows at a time through CatalogImportResource and yields a
+    ChunkResult for each one. Chunks are written in their own transaction, a chunk with errors
+    is rolled back on its own; with `dry_run` every chunk is rolled back and only the changes
+    are reported.
+    """
+    resource = CatalogImportResource()
+    headers, rows = _read_rows(file, file_format)
+    first_row = 1
+    while chunk := list(islice(rows, chunk_size)):
+        resource.changes = []
+        result = resource.import_data(Dataset(*chunk, headers=headers), dry_run=dry_run, use_transactions=True)
+        errors = [(None, str(error.error)) for error in result.base_errors]
+        errors += [(first_row + row.number - 1, str(error.error)) for row in result.error_rows for error in row.errors]
+        errors += [(first_row + row.number - 1, '; '.join(f'{field}: {", ".join(messages)}'
+                                                          for field, messages in row.error_dict.items()))
+                   for row in result.invalid_rows]
+        failed = {number for number, _ in errors}
+        changes = [(first_row + number - 1, pk, name, changed)
+                   for number, pk, name, changed in resource.changes if first_row + number - 1 not in failed]
+        yield ChunkResult(first_row, len(chunk), dict(result.totals), changes, errors)
+        first_row += len(chunk)
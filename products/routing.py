@@ -1,13 +1,7 @@
-from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
 from django.urls import path
 from products import consumers
 
-application = ProtocolTypeRouter({
-    # (http->django views is added by default)
-    'websocket': URLRouter([
-        path('ws/stock/', consumers.StockConsumer.as_asgi()),
-    ]),
-})
-
-application = AuthMiddlewareStack(application)
\ No newline at end of file
+websocket_urlpatterns = [
+    path('ws/stock/', consumers.StockConsumer.as_asgi()),
+    path('ws/stock/alerts/', consumers.StockAlertConsumer.as_asgi()),
+]
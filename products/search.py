@@ -0,0 +1,45 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import F, FloatField, Q, Value
+
+from products.models import Category, Supplier
+
+# Text search configuration used by the Products.search_vector trigger
+SEARCH_CONFIG = 'simple'
+# Word similarity from which a misspelled term still matches a name (pg_trgm defaults to 0.6)
+TRIGRAM_THRESHOLD = 0.4
+
+
+def set_trigram_threshold(sender, connection, **kwargs):
+    # connection_created receiver, the threshold applies to the <% operator behind trigram_word_similar
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, false)",
+                           [str(TRIGRAM_THRESHOLD)])
+
+
+def search_products(queryset, term):
+    """
+    Filters products by a free-text term and annotates their relevance as `search_rank`.
+    On Postgres it matches the full-text vector, typo-tolerant trigrams of the name and the
+    category and supplier names, all index-backed. Other databases fall back to substring matching.
+    """
+    term = (term or '').strip()
+    if not term:
+        return queryset
+
+    if connection.vendor != 'postgresql':
+        return queryset.filter(
+            Q(name__icontains=term) | Q(description__icontains=term)
+            | Q(category__name__icontains=term) | Q(supplier__name__icontains=term)
+        ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    query = SearchQuery(term, config=SEARCH_CONFIG, search_type='websearch')
+    return queryset.filter(
+        Q(search_vector=query)
+        | Q(name__trigram_word_similar=term)
+        | Q(category__in=Category.objects.filter(name__trigram_word_similar=term))
+        | Q(supplier__in=Supplier.objects.filter(name__trigram_word_similar=term))
+    ).annotate(
+        search_rank=SearchRank(F('search_vector'), query) + TrigramWordSimilarity(term, 'name')
+    )
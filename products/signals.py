@@ -1,12 +1,94 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
+from django.conf import settings
+
+from outbox.events import emit
+
+logger = logging.getLogger(__name__)
+
+
+def product_group(product_id):
+    return f"stock.product.{product_id}"
+
+
+def category_group(category_id):
+    return f"stock.category.{category_id}"
+
+
+class GroupPublisher:
+    """
+    Sends items to channel layer groups from a background thread, so the request that
+    produced them never waits on the channel layer.
+
+    Items wait `window` seconds before going out; a newer item with the same key replaces
+    the queued one, and each group gets its queued items in messages of at most
+    `batch_size` items, as events of type `event_type`.
+    """
+
+    def __init__(self, event_type, window, batch_size=100):
+        self.event_type = event_type
+        self.window = window
+        self.batch_size = batch_size
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def publish(self, key, groups, item):
+        with self._lock:
+            self._pending[key] = (groups, item)
+            self._wakeup.set()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.event_type, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            # Changes arriving during the window are coalesced into the same flush
+            time.sleep(self.window)
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = list(self._pending.values()), {}
+            self._wakeup.clear()
+        try:
+            self.send(pending)
+        except Exception:
+            logger.exception("Could not send %s %s items", len(pending), self.event_type)
+
+    def send(self, pending):
+        # Sends (groups, item) pairs right away, batched per group; errors reach the caller
+        channel_layer = get_channel_layer()
+        if channel_layer is None or not pending:
+            # No channel layer is configured, so there is nobody to tell
+            return
+        items_by_group = defaultdict(list)
+        for groups, item in pending:
+            for group in groups:
+                items_by_group[group].append(item)
+        for group, items in items_by_group.items():
+            for start in range(0, len(items), self.batch_size):
+                async_to_sync(channel_layer.group_send)(group, {
+                    "type": self.event_type, "items": items[start:start + self.batch_size]})
+
+
+stock_alerts = GroupPublisher("stock.alerts", settings.STOCK_ALERT_WINDOW)
+stock_updates = GroupPublisher("stock.update", settings.STOCK_ALERT_WINDOW)
+
+
+def send_stock_alert(product_name, message, **fields):
+    # Records the alert in the outbox, within the transaction of the stock change; the outbox worker sends it
+    emit('stock.alert', product=product_name, message=message, **fields)
 
 
-def send_stock_alert(product_name, message):
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(
-        "stock_alerts", {
-            "type": "stock.alert",
-            "message": message
-        }
-    )
+def send_stock_update(product_id, category_id, available):
+    # Queues [product id, unreserved stock] for the subscribers of the product and of its category
+    stock_updates.publish(product_id, (product_group(product_id), category_group(category_id)),
+                          [product_id, available])
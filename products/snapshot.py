@@ -0,0 +1,158 @@
+import threading
+import time
+from array import array
+from collections import namedtuple
+from datetime import timedelta
+
+from django.db.models import Sum
+
+from products.models import Inventory, Product
+
+# Stock figures of one product, summed over its inventories
+InventoryRow = namedtuple('InventoryRow', ['product_id', 'current_stock', 'reserved_stock', 'min_stock', 'max_stock'])
+
+# Seconds between checks for changed products, and between full rebuilds that also drop deleted products
+REFRESH_INTERVAL = 2
+FULL_REBUILD_INTERVAL = 600
+# Changes committed this long after their timestamp are still picked up by the next refresh
+OVERLAP = timedelta(seconds=10)
+
+
+class _Columns:
+    """
+    The figures of a snapshot: parallel typed arrays (a few bytes per product instead of a
+    model instance) and a product id -> position dict, so a lookup is a dict and an array read
+    and memory follows the number of products, not the largest id.
+    """
+
+    __slots__ = ('product_ids', 'current_stock', 'reserved_stock', 'min_stock', 'max_stock', 'positions')
+
+    def __init__(self):
+        self.product_ids = array('q')
+        self.current_stock = array('i')
+        self.reserved_stock = array('i')
+        self.min_stock = array('i')
+        self.max_stock = array('i')
+        self.positions = {}
+
+    def figures(self):
+        return self.current_stock, self.reserved_stock, self.min_stock, self.max_stock
+
+    def store(self, product_id, figures):
+        # Writes the figures of a product, appending it when it is new; returns whether anything changed.
+        # A new product gets its position last, once every column holds its row.
+        position = self.positions.get(product_id)
+        if position is None:
+            self.product_ids.append(product_id)
+            for column, value in zip(self.figures(), figures):
+                column.append(value)
+            self.positions[product_id] = len(self.product_ids) - 1
+            return True
+        changed = False
+        for column, value in zip(self.figures(), figures):
+            if column[position] != value:
+                column[position] = value
+                changed = True
+        return changed
+
+
+class InventorySnapshot:
+    """
+    In-memory copy of the stock of every product (see _Columns), read without a lock.
+
+    Every inventory write refreshes Product.updated_at (see ProductQuerySet.sync_stock), so a
+    refresh only re-reads the products changed since the last one. A full rebuild fills new
+    columns and swaps them in with one assignment, so readers see either the old figures or the
+    new ones, never a half-built table. `version` grows every time the figures change.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self.high_water = None
+        self._lock = threading.Lock()
+        self._checked_at = 0
+        self._built_at = 0
+        self._columns = _Columns()
+
+    def __len__(self):
+        return len(self._columns.product_ids)
+
+    def refresh(self, full=False):
+        """
+        Brings the snapshot up to date. A full rebuild reads every inventory; otherwise only
+        the products changed since the last refresh are re-aggregated, in two queries.
+        """
+        with self._lock:
+            full = full or self.high_water is None
+            products = Product.objects.all()
+            if not full:
+                products = products.filter(updated_at__gt=self.high_water - OVERLAP)
+            changed = dict(products.values_list('pk', 'updated_at'))
+            if not changed and not full:
+                self._checked_at = time.monotonic()
+                return
+
+            inventories = Inventory.objects.all() if full else Inventory.objects.filter(product_id__in=changed)
+            totals = {
+                row[0]: row[1:]
+                for row in inventories.values('product_id').annotate(
+                    current=Sum('current_stock'), reserved=Sum('reserved_stock'),
+                    minimum=Sum('min_stock'), maximum=Sum('max_stock'),
+                ).values_list('product_id', 'current', 'reserved', 'minimum', 'maximum').order_by()
+            }
+
+            # A full rebuild fills new columns, an incremental refresh updates the current ones in place
+            columns = _Columns() if full else self._columns
+            updated = full
+            for product_id in changed:
+                updated |= columns.store(product_id, totals.get(product_id, (0, 0, 0, 0)))
+            if full:
+                self._columns = columns
+            if updated:
+                self.version += 1
+            if changed:
+                self.high_water = max(changed.values()) if full else max(self.high_water, *changed.values())
+            self._checked_at = time.monotonic()
+            if full:
+                self._built_at = self._checked_at
+
+    def refresh_if_due(self):
+        now = time.monotonic()
+        if now - self._built_at > FULL_REBUILD_INTERVAL:
+            self.refresh(full=True)
+        elif now - self._checked_at > REFRESH_INTERVAL:
+            self.refresh()
+
+    def expire(self):
+        # Makes the next read refresh, used after this process moves stock.
+        self._checked_at = 0
+
+    # Reads, each taking the columns once so a full rebuild swapped in meanwhile is not mixed in
+
+    def get(self, product_id):
+        columns = self._columns
+        position = columns.positions.get(product_id)
+        if position is None:
+            return None
+        return InventoryRow(product_id, *(column[position] for column in columns.figures()))
+
+    def available(self, product_id):
+        columns = self._columns
+        position = columns.positions.get(product_id)
+        if position is None:
+            return 0
+        return columns.current_stock[position] - columns.reserved_stock[position]
+
+    def low_stock(self):
+        # Product ids whose stock is at or below their minimum, scanning the arrays without the ORM.
+        columns = self._columns
+        return [product_id for product_id, current, minimum
+                in zip(columns.product_ids, columns.current_stock, columns.min_stock) if current <= minimum]
+
+
+inventory_snapshot = InventorySnapshot()
+
+
+def get_inventory_snapshot():
+    inventory_snapshot.refresh_if_due()
+    return inventory_snapshot
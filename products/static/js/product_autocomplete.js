@@ -0,0 +1,26 @@
+// Suggests product names, with their stock and price, under every input with data-autocomplete-url
+document.querySelectorAll("input[data-autocomplete-url]").forEach(function(input) {
+    const list = document.createElement("datalist");
+    list.id = input.id + "-suggestions";
+    input.setAttribute("list", list.id);
+    input.after(list);
+
+    let timer = null;
+    input.addEventListener("input", function() {
+        clearTimeout(timer);
+        // Waits for a pause in the typing, one request per word instead of one per key
+        timer = setTimeout(function() {
+            const url = input.dataset.autocompleteUrl + "?term=" + encodeURIComponent(input.value);
+            fetch(url).then(function(response) {
+                return response.json();
+            }).then(function(data) {
+                list.replaceChildren(...data.results.map(function(product) {
+                    const option = document.createElement("option");
+                    option.value = product.name;
+                    option.label = product.text;
+                    return option;
+                }));
+            });
+        }, 200);
+    });
+});
@@ -1,7 +1,9 @@
-const socket = new WebSocket("ws://localhost:8000/ws/stock/");
+const socket = new WebSocket("ws://localhost:8000/ws/stock/alerts/");
 
 socket.onmessage = function(event) {
     const data = JSON.parse(event.data);
-    console.log(data.message);
-    // Updates the UI with the new stock information
+    data.alerts.forEach(function(alert) {
+        console.log(alert.message);
+        // Updates the UI with the new stock information
+    });
 };
@@ -0,0 +1,22 @@
+// Follows the stock of some products and category subtrees, e.g. for a shop floor display
+function followStock(products, categories, onStock) {
+    const socket = new WebSocket("ws://localhost:8000/ws/stock/");
+
+    socket.onopen = function() {
+        socket.send(JSON.stringify({action: "subscribe", products: products, categories: categories}));
+    };
+
+    socket.onmessage = function(event) {
+        const data = JSON.parse(event.data);
+        if (data.error) {
+            console.error(data.error);
+            return;
+        }
+        // Each entry is [product id, unreserved stock]
+        data.stock.forEach(function(entry) {
+            onStock(entry[0], entry[1]);
+        });
+    };
+
+    return socket;
+}
@@ -0,0 +1,194 @@
+from collections import defaultdict, namedtuple
+
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Case, F, Sum, Value, When
+
+from products.models import Inventory, InventoryMovement
+from products.snapshot import inventory_snapshot
+
+
+# A product whose stock does not cover the requested quantity
+StockShortfall = namedtuple('StockShortfall', ['product_id', 'product_name', 'requested', 'available'])
+
+
+class InsufficientStockError(ValidationError):
+    def __init__(self, shortfalls):
+        self.shortfalls = shortfalls
+        super().__init__([
+            f"The stock of the product {shortfall.product_name or shortfall.product_id} is insufficient to "
+            f"complete the sale ({shortfall.requested} requested, {shortfall.available} available)."
+            for shortfall in shortfalls
+        ])
+
+
+def aggregate_lines(lines):
+    # Adds up the quantities of (product_id, quantity) pairs, ignoring empty lines.
+    quantities = defaultdict(int)
+    for product_id, quantity in lines:
+        if product_id is not None and quantity:
+            quantities[product_id] += quantity
+    return dict(quantities)
+
+
+def validate_stock(lines, held=None):
+    """
+    Checks (product_id, quantity) lines against the unreserved stock of the inventories with a single query.
+    `held` maps product ids to units the order already holds (its reservations, or stock it took and gives
+    back first), which count as available to it.
+    Returns every shortfall at once; an empty list means the whole order can be served.
+    """
+    quantities = aggregate_lines(lines)
+    if not quantities:
+        return []
+
+    available = {
+        product_id: (name, total)
+        for product_id, name, total in Inventory.objects.filter(product_id__in=quantities)
+        .values('product_id', 'product__name').annotate(total=Sum('current_stock') - Sum('reserved_stock'))
+        .values_list('product_id', 'product__name', 'total')
+    }
+    shortfalls = []
+    for product_id, requested in sorted(quantities.items()):
+        name, total = available.get(product_id, (None, 0))
+        total += (held or {}).get(product_id, 0)
+        if requested > total:
+            shortfalls.append(StockShortfall(product_id, name, requested, total))
+    return shortfalls
+
+
+def _locked_inventories(product_ids):
+    # Rows are locked in product id order so concurrent movements can never deadlock each other.
+    return list(
+        Inventory.objects.select_for_update()
+        .filter(product_id__in=product_ids)
+        .order_by('product_id', 'pk')
+        .values_list('pk', 'product_id', 'current_stock', 'reserved_stock')
+    )
+
+
+def _rows_amount(units_by_row):
+    return Case(*[When(pk=pk, then=Value(units)) for pk, units in units_by_row.items()],
+                output_field=models.PositiveIntegerField())
+
+
+def _take_from_rows(taken):
+    # Writes every row decrement with a single UPDATE that only applies where enough unreserved stock remains.
+    amount = _rows_amount(taken)
+    return (Inventory.objects.filter(pk__in=taken, current_stock__gte=F('reserved_stock') + amount)
+            .update(current_stock=F('current_stock') - amount))
+
+
+def _distribute(quantities, rows):
+    # Spreads the requested quantities over the free stock of each product's inventories, in row order.
+    units_by_row = {}
+    remaining = dict(quantities)
+    for pk, product_id, current_stock, reserved_stock in rows:
+        units = min(current_stock - reserved_stock, remaining[product_id])
+        if units > 0:
+            units_by_row[pk] = units
+            remaining[product_id] -= units
+
+    shortfalls = [StockShortfall(product_id, None, quantities[product_id], quantities[product_id] - missing)
+                  for product_id, missing in sorted(remaining.items()) if missing > 0]
+    if shortfalls:
+        raise InsufficientStockError(shortfalls)
+    return units_by_row
+
+
+def _record_movements(units_by_row, rows, reason, reference=None, sign=1):
+    # Writes one ledger movement per inventory row moved, in a single INSERT.
+    product_by_row = {row[0]: row[1] for row in rows}
+    InventoryMovement.objects.bulk_create([
+        InventoryMovement(product_id=product_by_row[pk], inventory_id=pk, quantity=sign * units,
+                          reason=reason, reference_id=reference)
+        for pk, units in units_by_row.items()
+    ])
+
+
+def _expire_snapshot():
+    # The snapshot of this process re-reads the moved products once the transaction commits
+    transaction.on_commit(inventory_snapshot.expire)
+
+
+def decrement_stock(lines, reason='sale', reference=None):
+    """
+    Takes the quantities of (product_id, quantity) lines out of the inventories as one set-based update.
+    Nothing is written unless every product has enough unreserved stock.
+    """
+    quantities = aggregate_lines(lines)
+    if not quantities:
+        return
+
+    with transaction.atomic():
+        rows = _locked_inventories(quantities)
+        taken = _distribute(quantities, rows)
+        if _take_from_rows(taken) != len(taken):
+            raise ValidationError("The inventory changed while the stock was being updated.")
+        _record_movements(taken, rows, reason, reference, sign=-1)
+        _expire_snapshot()
+
+
+def increment_stock(lines, reason, reference=None):
+    """
+    Puts the quantities of (product_id, quantity) lines into stock with one set-based update,
+    on the first inventory of each product. Products without an inventory get one.
+    """
+    quantities = aggregate_lines(lines)
+    if not quantities:
+        return
+
+    with transaction.atomic():
+        rows = _locked_inventories(quantities)
+        first_rows = {}
+        for row in rows:
+            first_rows.setdefault(row[1], row)
+        missing = sorted(quantities.keys() - first_rows.keys())
+        for inventory in Inventory.objects.bulk_create([Inventory(product_id=pk) for pk in missing]):
+            first_rows[inventory.product_id] = (inventory.pk, inventory.product_id, 0, 0)
+
+        added = {row[0]: quantities[product_id] for product_id, row in first_rows.items()}
+        Inventory.objects.filter(pk__in=added).update(current_stock=F('current_stock') + _rows_amount(added))
+        _record_movements(added, first_rows.values(), reason, reference)
+        _expire_snapshot()
+
+
+def reserve_stock(lines):
+    """
+    Holds the quantities of (product_id, quantity) lines on the inventories without taking them.
+    Returns the units reserved per inventory row, which is what release_stock() expects back.
+    """
+    quantities = aggregate_lines(lines)
+    if not quantities:
+        return {}
+
+    with transaction.atomic():
+        reserved = _distribute(quantities, _locked_inventories(quantities))
+        amount = _rows_amount(reserved)
+        updated = (Inventory.objects.filter(pk__in=reserved, current_stock__gte=F('reserved_stock') + amount)
+                   .update(reserved_stock=F('reserved_stock') + amount))
+        if updated != len(reserved):
+            raise ValidationError("The inventory changed while the stock was being reserved.")
+        _expire_snapshot()
+    return reserved
+
+
+def release_stock(reserved):
+    # Gives back the units reserved per inventory row with a single UPDATE.
+    if not reserved:
+        return
+    with transaction.atomic():
+        # The rows are locked in the same order as every other stock movement before they are updated
+        list(Inventory.objects.select_for_update().filter(pk__in=reserved)
+             .order_by('product_id', 'pk').values_list('pk', flat=True))
+        amount = _rows_amount(reserved)
+        updated = (Inventory.objects.filter(pk__in=reserved, reserved_stock__gte=amount)
+                   .update(reserved_stock=F('reserved_stock') - amount))
+        if updated != len(reserved):
+            raise ValidationError("The inventory changed while the stock was being released.")
+        _expire_snapshot()
+
+
+def apply_purchase(purchase):
+    # Puts every line item of the purchase into the inventories at once.
+    increment_stock(purchase.items.values_list('product_id', 'quantity'), 'purchase', reference=purchase.pk)
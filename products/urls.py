@@ -0,0 +1,13 @@
+from django.urls import path
+
+from products import views
+
+app_name = 'products'
+
+urlpatterns = [
+    path('products/', views.product_list, name='product_list'),
+    path('products/<slug:slug>/', views.product_detail, name='product_detail'),
+    path('categories/', views.category_list, name='category_list'),
+    path('autocomplete/', views.product_autocomplete, name='autocomplete'),
+    path('cache/metrics/', views.cache_metrics, name='cache_metrics'),
+]
@@ -1,3 +1,181 @@
-from django.shortcuts import render
+import base64
+import binascii
+import hashlib
+import json
 
-# Create your views here.
+from django.db.models import Prefetch, Q
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_GET
+
+from products.autocomplete import AUTOCOMPLETE_LIMIT, MAX_AUTOCOMPLETE_LIMIT, match_products
+from products.cache import cache_stats, catalog_cache
+from products.categories import category_menu, subtree_filter
+from products.models import Product, Variation
+from products.snapshot import get_inventory_snapshot
+
+# Catalog page size when the client does not ask for one, and the largest it may ask for
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(name, pk):
+    # The cursor is the (name, id) of the last product of a page, opaque to the clients
+    return base64.urlsafe_b64encode(json.dumps([name, pk]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        name, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError, TypeError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(name, str) or not isinstance(pk, int):
+        raise ValueError("Invalid cursor")
+    return name, pk
+
+
+def serialize_product(product):
+    return {
+        'id': product.pk,
+        'name': product.name,
+        'slug': product.slug,
+        'description': product.description,
+        'sale_price': str(product.sale_price),
+        'available_stock': product.available_stock,
+        'image': product.image.url if product.image else None,
+        'category': {'id': product.category_id, 'name': product.category.name},
+        'variations': [
+            {'id': variation.pk, 'category': variation.category, 'name': variation.name, 'state': variation.state}
+            for variation in product.variations.all()
+        ],
+    }
+
+
+def catalog_products():
+    # Products with everything the catalog shows, in a fixed number of queries whatever the page size
+    return Product.objects.select_related('category').prefetch_related(
+        Prefetch('variations', queryset=Variation.objects.exclude(state='deleted').order_by('pk'))
+    )
+
+
+def _validators(rows, variant=None):
+    # ETag and Last-Modified of a list of (id, updated_at) rows
+    digest = hashlib.md5(repr((rows, variant)).encode(), usedforsecurity=False).hexdigest()
+    last_modified = max((updated_at for _, updated_at in rows), default=None)
+    return f'"{digest}"', int(last_modified.timestamp()) if last_modified else None
+
+
+def _conditional(request, name, rows, build, variant=None):
+    """
+    Answers 304 when the client already holds the representation of `rows`, otherwise
+    returns the JSON built by `build` with its validators. Nothing is serialized for a 304,
+    and built payloads are cached under their ETag, which changes whenever the rows do.
+    """
+    etag, last_modified = _validators(rows, variant)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = JsonResponse(catalog_cache.get_or_set(f'{name}:{etag}', build))
+    response.headers['ETag'] = etag
+    if last_modified is not None:
+        response.headers['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+@require_GET
+def product_list(request):
+    """
+    Lists the catalog ordered by (name, id) with keyset pagination: `cursor` continues after the
+    last product of the previous page, `limit` sets the page size and `category` keeps the products
+    of a category and its subcategories.
+    """
+    try:
+        limit = min(max(int(request.GET.get('limit', PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        category = int(request.GET['category']) if request.GET.get('category') else None
+    except ValueError:
+        return JsonResponse({'error': "limit and category must be numbers"}, status=400)
+
+    queryset = Product.objects.order_by('name', 'id')
+    if category is not None:
+        # A range join on the MPTT range of the category
+        queryset = queryset.filter(subtree_filter([category]))
+    if request.GET.get('cursor'):
+        try:
+            name, pk = decode_cursor(request.GET['cursor'])
+        except ValueError as error:
+            return JsonResponse({'error': str(error)}, status=400)
+        queryset = queryset.filter(Q(name__gt=name) | Q(name=name, id__gt=pk))
+
+    # The page is first read as (id, name, updated_at) only, which is all the validators and the cursor need
+    page = list(queryset.values_list('id', 'name', 'updated_at')[:limit + 1])
+    has_next = len(page) > limit
+    page = page[:limit]
+    rows = [(pk, updated_at) for pk, _, updated_at in page]
+    # The next cursor is the last row in the database order, the collation the cursor filter compares with
+    cursor = encode_cursor(page[-1][1], page[-1][0]) if has_next else None
+
+    def build():
+        # The products keep the order of the page, Python would sort names differently from the collation
+        position = {pk: index for index, (pk, _) in enumerate(rows)}
+        products = sorted(catalog_products().filter(pk__in=position), key=lambda product: position[product.pk])
+        return {
+            'results': [serialize_product(product) for product in products],
+            'next': cursor,
+        }
+
+    return _conditional(request, 'products', rows, build, variant=has_next)
+
+
+@require_GET
+def product_detail(request, slug):
+    row = get_object_or_404(Product.objects.values_list('id', 'updated_at'), slug=slug)
+    return _conditional(request, 'product', [row], lambda: serialize_product(catalog_products().get(pk=row[0])))
+
+
+@require_GET
+def category_list(request):
+    # The storefront menu: the category tree in tree order with breadcrumbs and product counts, from the cache
+    etag, menu = category_menu()
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(menu)
+    response.headers['ETag'] = etag
+    return response
+
+
+@require_GET
+def product_autocomplete(request):
+    """
+    Products whose name starts with `term`, with their unreserved stock and price, in the
+    format of the admin autocomplete. Matches come from the autocomplete cache and stock from
+    the inventory snapshot, so a warm lookup runs no query. Staff also get the purchase price.
+    """
+    try:
+        limit = min(max(int(request.GET.get('limit', AUTOCOMPLETE_LIMIT)), 1), MAX_AUTOCOMPLETE_LIMIT)
+    except ValueError:
+        return JsonResponse({'error': "limit must be a number"}, status=400)
+
+    snapshot = get_inventory_snapshot()
+    results = []
+    for pk, name, sale_price, purchase_price in match_products(request.GET.get('term', ''), limit):
+        available = snapshot.available(pk)
+        result = {
+            'id': pk,
+            'text': f"{name} ({available} in stock, {sale_price})",
+            'name': name,
+            'available_stock': available,
+            'sale_price': str(sale_price),
+        }
+        if request.user.is_staff:
+            result['purchase_price'] = str(purchase_price)
+        results.append(result)
+    return JsonResponse({'results': results, 'pagination': {'more': False}})
+
+
+@staff_member_required
+@require_GET
+def cache_metrics(request):
+    # Hit and miss counters of the two-tier caches of the process serving the request
+    return JsonResponse(cache_stats())
@@ -0,0 +1,20 @@
+from django import forms
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.urls import reverse, reverse_lazy
+
+
+class ProductAutocompleteSelect(AutocompleteSelect):
+    # Admin select2 picker fed by the cached product autocomplete instead of the admin search view;
+    # only the selected product is rendered into the page
+    def get_url(self):
+        return reverse('products:autocomplete')
+
+
+class ProductAutocompleteInput(forms.TextInput):
+    # Text input suggesting product names from the autocomplete endpoint as the user types
+    def __init__(self, attrs=None):
+        super().__init__({'data-autocomplete-url': reverse_lazy('products:autocomplete'),
+                          'autocomplete': 'off', **(attrs or {})})
+
+    class Media:
+        js = ('js/product_autocomplete.js',)
@@ -0,0 +1,36 @@
+from django.contrib import admin
+
+from .models import DailyProductSales, DailyCategorySales, DailyCustomerSales
+
+
+# The rollups are maintained by reports.rollups, the admin only shows them
+class DailySalesAdmin(admin.ModelAdmin):
+    date_hierarchy = 'date'
+    list_filter = ('date',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DailyProductSales)
+class DailyProductSalesAdmin(DailySalesAdmin):
+    list_display = ('date', 'product', 'quantity', 'revenue', 'cost', 'margin')
+    list_select_related = ('product',)
+    search_fields = ('product__name',)
+
+
+@admin.register(DailyCategorySales)
+class DailyCategorySalesAdmin(DailySalesAdmin):
+    list_display = ('date', 'category', 'quantity', 'revenue', 'cost', 'margin')
+    list_select_related = ('category',)
+    search_fields = ('category__name',)
+
+
+@admin.register(DailyCustomerSales)
+class DailyCustomerSalesAdmin(DailySalesAdmin):
+    list_display = ('date', 'customer', 'quantity', 'revenue', 'cost', 'margin')
+    list_select_related = ('customer',)
+    search_fields = ('customer__name',)
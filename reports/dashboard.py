@@ -0,0 +1,94 @@
+import threading
+from collections import namedtuple
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Sum
+from django.utils import timezone
+
+from products.snapshot import get_inventory_snapshot
+from sales.models import Return, Sale
+from .models import DailyProductSales
+
+# A dashboard figure: how long it stays fresh (seconds) and how it is computed
+Widget = namedtuple('Widget', ['name', 'ttl', 'compute'])
+
+# Stale figures are still shown for this many TTLs while they are recomputed in the background
+STALE_FACTOR = 10
+
+
+def todays_revenue():
+    return DailyProductSales.objects.filter(date=timezone.localdate()).aggregate(
+        revenue=Sum('revenue'))['revenue'] or 0
+
+
+def pending_sales():
+    return Sale.objects.filter(state='pending').count()
+
+
+def low_stock():
+    return len(get_inventory_snapshot().low_stock())
+
+
+def top_sellers(days=30, limit=5):
+    since = timezone.localdate() - timedelta(days=days)
+    return list(DailyProductSales.objects.filter(date__gte=since).values('product__name')
+                .annotate(units=Sum('quantity')).order_by('-units').values_list('product__name', 'units')[:limit])
+
+
+def open_returns():
+    return Return.objects.filter(status__in=('pending', 'in_process', 'processed')).count()
+
+
+WIDGETS = (
+    Widget('todays_revenue', 60, todays_revenue),
+    Widget('pending_sales', 30, pending_sales),
+    Widget('low_stock', 120, low_stock),
+    Widget('top_sellers', 600, top_sellers),
+    Widget('open_returns', 120, open_returns),
+)
+
+
+def _key(widget):
+    return f'dashboard:{widget.name}'
+
+
+def refresh_widget(widget):
+    # Computes a widget and caches it with the moment it stops being fresh.
+    now = timezone.now()
+    value = widget.compute()
+    cache.set(_key(widget), (value, now, now + timedelta(seconds=widget.ttl)), timeout=widget.ttl * STALE_FACTOR)
+    return value
+
+
+def _refresh_in_background(widget):
+    # Only one process recomputes a widget at a time; the others keep serving what is cached.
+    if not cache.add(f'{_key(widget)}:lock', True, timeout=widget.ttl):
+        return
+
+    def run():
+        try:
+            refresh_widget(widget)
+        finally:
+            cache.delete(f'{_key(widget)}:lock')
+            connections.close_all()
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def get_dashboard():
+    """
+    Returns the cached figures keyed by widget name, reading them all in one cache round trip.
+    Missing or stale figures are recomputed in the background, never inside the request.
+    A widget that has never been computed shows as None until the first refresh lands.
+    """
+    now = timezone.now()
+    cached = cache.get_many([_key(widget) for widget in WIDGETS])
+    dashboard = {}
+    for widget in WIDGETS:
+        value, computed_at, fresh_until = cached.get(_key(widget), (None, None, None))
+        if fresh_until is None or fresh_until <= now:
+            _refresh_in_background(widget)
+        dashboard[widget.name] = {'value': value, 'computed_at': computed_at}
+    return dashboard
@@ -0,0 +1,106 @@
+import csv
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+from tempfile import TemporaryFile
+
+from django.db.models import DecimalField, ExpressionWrapper, F
+from django.utils import timezone
+
+from products.models import Product
+from sales.models import Customer, SaleItem
+
+# Rows fetched from the server-side cursor at a time, and rows written into each chunk of a CSV response
+CHUNK_SIZE = 2000
+CSV_ROWS_PER_CHUNK = 500
+
+# Queryset of an export, its (header, value) columns and the date field `since`/`until` filter on.
+# Related names are columns of the same query, joined by the database.
+Export = namedtuple('Export', ['queryset', 'columns', 'date_field'])
+
+EXPORTS = {
+    'products': Export(
+        lambda: Product.objects.with_margins(),
+        [('ID', 'pk'), ('Name', 'name'), ('Slug', 'slug'), ('Category', 'category__name'),
+         ('Supplier', 'supplier__name'), ('Purchase price', 'purchase_price'), ('Sale price', 'sale_price'),
+         ('Unit profit', 'unit_profit'), ('Margin %', 'margin'), ('Markup %', 'markup'), ('Stock', 'stock'),
+         ('Reserved', 'reserved_stock'), ('Created', 'created_at')],
+        'created_at',
+    ),
+    'sale-items': Export(
+        lambda: SaleItem.objects.annotate(line_total=ExpressionWrapper(
+            F('sale_price') * F('quantity'), output_field=DecimalField(max_digits=12, decimal_places=2))),
+        [('ID', 'pk'), ('Sale', 'sale_id'), ('Date', 'sale__sale_date'), ('State', 'sale__state'),
+         ('Customer', 'sale__customer__name'), ('Product', 'product__name'), ('Category', 'product__category__name'),
+         ('Quantity', 'quantity'), ('Price', 'sale_price'), ('Subtotal', 'line_total')],
+        'sale__sale_date',
+    ),
+    'customers': Export(
+        lambda: Customer.objects.all(),
+        [('ID', 'pk'), ('Name', 'name'), ('Email', 'email'), ('Phone', 'phone_number'), ('Address', 'address'),
+         ('Gender', 'gender'), ('Birth date', 'birth_date'), ('Active', 'is_active'), ('Created', 'created_at')],
+        'created_at',
+    ),
+}
+
+
+def export_rows(name, since=None, until=None):
+    """
+    Yields the header and then every row of an export, optionally limited to the dates from
+    `since` to `until` inclusive. Rows come from a server-side cursor CHUNK_SIZE at a time,
+    so memory does not grow with the number of rows.
+    """
+    export = EXPORTS[name]
+    queryset = export.queryset()
+    # Bounds are compared as datetimes so the date field index can be used
+    if since:
+        queryset = queryset.filter(**{f'{export.date_field}__gte': timezone.make_aware(
+            datetime.combine(since, time.min))})
+    if until:
+        queryset = queryset.filter(**{f'{export.date_field}__lt': timezone.make_aware(
+            datetime.combine(until + timedelta(days=1), time.min))})
+    yield [header for header, _ in export.columns]
+    yield from queryset.order_by('pk').values_list(*(value for _, value in export.columns)).iterator(
+        chunk_size=CHUNK_SIZE)
+
+
+class _Echo:
+    # File-like object handing back what csv.writer writes, so rows can be yielded instead of buffered
+    def write(self, value):
+        return value
+
+
+def csv_chunks(rows):
+    # Encodes rows as CSV text, CSV_ROWS_PER_CHUNK rows per chunk
+    writer = csv.writer(_Echo())
+    chunk = []
+    for row in rows:
+        chunk.append(writer.writerow(row))
+        if len(chunk) == CSV_ROWS_PER_CHUNK:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def _excel_value(value):
+    # Excel has no time zones, datetimes are written in local time
+    if isinstance(value, datetime) and timezone.is_aware(value):
+        return timezone.make_naive(value)
+    return value
+
+
+def xlsx_file(rows, title):
+    """
+    Writes rows into an XLSX workbook in a temporary file and returns the file, rewound.
+    The write-only workbook keeps rows on disk as they are appended, not in memory.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+    for row in rows:
+        sheet.append([_excel_value(value) for value in row])
+    file = TemporaryFile()
+    workbook.save(file)
+    file.seek(0)
+    return file
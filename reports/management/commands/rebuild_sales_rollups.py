@@ -0,0 +1,33 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from reports.rollups import rebuild
+from sales.models import Sale
+
+
+class Command(BaseCommand):
+    help = "Backfills or rebuilds the daily sales rollups for a range of dates"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help="First day to rebuild (YYYY-MM-DD)")
+        parser.add_argument('--end', type=date.fromisoformat, help="Last day to rebuild (YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        start, end = options['start'], options['end']
+        if start is None or end is None:
+            # Without explicit dates the whole sales history is rebuilt
+            bounds = Sale.objects.aggregate(first=Min('sale_date'), last=Max('sale_date'))
+            if bounds['first'] is None:
+                self.stdout.write("There are no sales to roll up")
+                return
+            start = start or timezone.localdate(bounds['first'])
+            end = end or timezone.localdate(bounds['last'])
+        if start > end:
+            raise CommandError("The start date must not be after the end date")
+
+        rebuild(start, end)
+        days = (end - start + timedelta(days=1)).days
+        self.stdout.write(self.style.SUCCESS(f"Sales rollups rebuilt for {days} days ({start} to {end})"))
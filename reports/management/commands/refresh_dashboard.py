@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from reports.dashboard import WIDGETS, refresh_widget
+
+
+class Command(BaseCommand):
+    help = "Recomputes every admin dashboard figure and stores it in the cache"
+
+    def handle(self, *args, **options):
+        for widget in WIDGETS:
+            refresh_widget(widget)
+        self.stdout.write(self.style.SUCCESS(f"{len(WIDGETS)} dashboard figures refreshed"))
@@ -0,0 +1,86 @@
+# Generated by Django 5.0.14 on 2026-10-18 17:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('products', '0015_inventory_reserved_stock_product_reserved_stock'),
+        ('sales', '0008_stockreservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCategorySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(db_index=True, help_text='Day of the finished sales')),
+                ('quantity', models.IntegerField(default=0, help_text='Units sold')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, help_text='Sale price times units', max_digits=14)),
+                ('cost', models.DecimalField(decimal_places=2, default=0, help_text='Purchase price times units', max_digits=14)),
+                ('margin', models.DecimalField(decimal_places=2, default=0, help_text='Revenue minus cost', max_digits=14)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='products.category')),
+            ],
+            options={
+                'verbose_name': 'daily category sales',
+                'verbose_name_plural': 'daily category sales',
+                'db_table': 'DailyCategorySales',
+                'ordering': ['-date'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyCustomerSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(db_index=True, help_text='Day of the finished sales')),
+                ('quantity', models.IntegerField(default=0, help_text='Units sold')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, help_text='Sale price times units', max_digits=14)),
+                ('cost', models.DecimalField(decimal_places=2, default=0, help_text='Purchase price times units', max_digits=14)),
+                ('margin', models.DecimalField(decimal_places=2, default=0, help_text='Revenue minus cost', max_digits=14)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='sales.customer')),
+            ],
+            options={
+                'verbose_name': 'daily customer sales',
+                'verbose_name_plural': 'daily customer sales',
+                'db_table': 'DailyCustomerSales',
+                'ordering': ['-date'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(db_index=True, help_text='Day of the finished sales')),
+                ('quantity', models.IntegerField(default=0, help_text='Units sold')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, help_text='Sale price times units', max_digits=14)),
+                ('cost', models.DecimalField(decimal_places=2, default=0, help_text='Purchase price times units', max_digits=14)),
+                ('margin', models.DecimalField(decimal_places=2, default=0, help_text='Revenue minus cost', max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'daily product sales',
+                'verbose_name_plural': 'daily product sales',
+                'db_table': 'DailyProductSales',
+                'ordering': ['-date'],
+                'abstract': False,
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailycategorysales',
+            constraint=models.UniqueConstraint(fields=('date', 'category'), name='unique_daily_category_sales'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycustomersales',
+            constraint=models.UniqueConstraint(fields=('date', 'customer'), name='unique_daily_customer_sales'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyproductsales',
+            constraint=models.UniqueConstraint(fields=('date', 'product'), name='unique_daily_product_sales'),
+        ),
+    ]
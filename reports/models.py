@@ -0,0 +1,56 @@
+from django.db import models
+
+from products.models import Category, Product
+from sales.models import Customer
+
+
+# Base model for the daily sales rollups, one row per day and key
+class DailySales(models.Model):
+    date = models.DateField(db_index=True, help_text="Day of the finished sales")
+    quantity = models.IntegerField(default=0, help_text="Units sold")
+    revenue = models.DecimalField(default=0, max_digits=14, decimal_places=2, help_text="Sale price times units")
+    cost = models.DecimalField(default=0, max_digits=14, decimal_places=2, help_text="Purchase price times units")
+    margin = models.DecimalField(default=0, max_digits=14, decimal_places=2, help_text="Revenue minus cost")
+
+    class Meta:
+        abstract = True
+        ordering = ['-date']
+
+
+class DailyProductSales(DailySales):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+
+    def __str__(self):
+        return f"{self.date} - {self.product_id} - {self.revenue}"
+
+    class Meta(DailySales.Meta):
+        db_table = "DailyProductSales"
+        verbose_name = 'daily product sales'
+        verbose_name_plural = 'daily product sales'
+        constraints = [models.UniqueConstraint(fields=['date', 'product'], name='unique_daily_product_sales')]
+
+
+class DailyCategorySales(DailySales):
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='daily_sales')
+
+    def __str__(self):
+        return f"{self.date} - {self.category_id} - {self.revenue}"
+
+    class Meta(DailySales.Meta):
+        db_table = "DailyCategorySales"
+        verbose_name = 'daily category sales'
+        verbose_name_plural = 'daily category sales'
+        constraints = [models.UniqueConstraint(fields=['date', 'category'], name='unique_daily_category_sales')]
+
+
+class DailyCustomerSales(DailySales):
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='daily_sales')
+
+    def __str__(self):
+        return f"{self.date} - {self.customer_id} - {self.revenue}"
+
+    class Meta(DailySales.Meta):
+        db_table = "DailyCustomerSales"
+        verbose_name = 'daily customer sales'
+        verbose_name_plural = 'daily customer sales'
+        constraints = [models.UniqueConstraint(fields=['date', 'customer'], name='unique_daily_customer_sales')]
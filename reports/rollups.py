@@ -0,0 +1,88 @@
+from datetime import datetime, time, timedelta
+
+from django.db import models, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from sales.models import SaleItem
+from .models import DailyProductSales, DailyCategorySales, DailyCustomerSales
+
+AMOUNT = models.DecimalField(max_digits=14, decimal_places=2)
+
+# Rollup model, its key field and the SaleItem path that feeds that key
+ROLLUPS = (
+    (DailyProductSales, 'product_id', 'product_id'),
+    (DailyCategorySales, 'category_id', 'product__category_id'),
+    (DailyCustomerSales, 'customer_id', 'sale__customer_id'),
+)
+
+
+def _day_range(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def refresh_day(day, product_ids=None, category_ids=None, customer_ids=None):
+    """
+    Recomputes the rollups of one day from its finished sale items.
+    When key ids are given only those rows are rebuilt, otherwise the whole day is.
+    Rebuilding replaces the rows, so refreshing the same keys twice is harmless.
+    """
+    # The day is half open, a sale at midnight belongs to the day it starts
+    start, end = _day_range(day)
+    items = SaleItem.objects.filter(sale__state='finished', sale__sale_date__gte=start, sale__sale_date__lt=end,
+                                    product__isnull=False)
+    with transaction.atomic():
+        for (model, key, source), ids in zip(ROLLUPS, (product_ids, category_ids, customer_ids)):
+            rows = items.filter(**{f'{source}__isnull': False})
+            existing = model.objects.filter(date=day)
+            if ids is not None:
+                ids = [pk for pk in ids if pk is not None]
+                rows = rows.filter(**{f'{source}__in': ids})
+                existing = existing.filter(**{f'{key}__in': ids})
+
+            totals = rows.values(source).annotate(
+                units=Sum('quantity'),
+                income=Sum(F('sale_price') * F('quantity'), output_field=AMOUNT),
+                expense=Sum(F('product__purchase_price') * F('quantity'), output_field=AMOUNT),
+            ).order_by()
+            existing.delete()
+            model.objects.bulk_create([
+                model(date=day, quantity=row['units'] or 0, revenue=row['income'] or 0, cost=row['expense'] or 0,
+                      margin=(row['income'] or 0) - (row['expense'] or 0), **{key: row[source]})
+                for row in totals
+            ])
+
+
+def refresh_sales(sales, previous=()):
+    """
+    Refreshes the rollup rows touched by the given sales, whatever state they are in now.
+    `previous` holds (day, product_ids, category_ids, customer_ids) keys the sales' items counted
+    under before they were edited, moved or deleted, whose rows are rebuilt too.
+    """
+    keys = {}
+
+    def add(day, *key_ids):
+        day_keys = keys.setdefault(day, (set(), set(), set()))
+        for ids, pks in zip(day_keys, key_ids):
+            ids.update(pks)
+
+    for day, product_ids, category_ids, customer_ids in previous:
+        add(day, product_ids, category_ids, customer_ids)
+    touched = (SaleItem.objects.filter(sale__in=sales, product__isnull=False)
+               .annotate(day=TruncDate('sale__sale_date'))
+               .values_list('day', 'product_id', 'product__category_id', 'sale__customer_id').distinct())
+    for day, product_id, category_id, customer_id in touched:
+        add(day, [product_id], [category_id], [customer_id])
+
+    for day, (product_ids, category_ids, customer_ids) in sorted(keys.items()):
+        refresh_day(day, product_ids, category_ids, customer_ids)
+
+
+def rebuild(start, end):
+    # Rebuilds every rollup row between two dates, both included.
+    day = start
+    while day <= end:
+        refresh_day(day)
+        day += timedelta(days=1)
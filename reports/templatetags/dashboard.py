@@ -0,0 +1,10 @@
+from django import template
+
+from reports.dashboard import get_dashboard
+
+register = template.Library()
+
+
+@register.inclusion_tag('reports/dashboard.html')
+def dashboard_widgets():
+    return {'dashboard': get_dashboard()}
@@ -0,0 +1,9 @@
+from django.urls import path
+
+from reports import views
+
+app_name = 'reports'
+
+urlpatterns = [
+    path('<slug:name>.<str:file_format>', views.export, name='export'),
+]
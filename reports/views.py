@@ -0,0 +1,49 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth import get_permission_codename
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import require_GET
+
+from .exports import EXPORTS, csv_chunks, export_rows, xlsx_file
+
+
+def _date_param(request, key):
+    value = request.GET.get(key)
+    if not value:
+        return None
+    try:
+        date = parse_date(value)
+    except ValueError:
+        date = None
+    if date is None:
+        raise ValueError(f"{key} must be a date in the YYYY-MM-DD format")
+    return date
+
+
+@staff_member_required
+@require_GET
+def export(request, name, file_format):
+    """
+    Downloads the products, sale items or customers as CSV or XLSX. CSV is streamed as the rows
+    are read; `since` and `until` (YYYY-MM-DD) limit the rows to a range of dates. The user needs
+    the view permission of the exported model, as in the admin.
+    """
+    if name not in EXPORTS or file_format not in ('csv', 'xlsx'):
+        raise Http404
+    opts = EXPORTS[name].queryset().model._meta
+    if not request.user.has_perm(f"{opts.app_label}.{get_permission_codename('view', opts)}"):
+        raise PermissionDenied
+    try:
+        since, until = _date_param(request, 'since'), _date_param(request, 'until')
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    rows = export_rows(name, since, until)
+    filename = f"{name}-{timezone.localdate().isoformat()}.{file_format}"
+    if file_format == 'xlsx':
+        return FileResponse(xlsx_file(rows, name), as_attachment=True, filename=filename)
+    response = StreamingHttpResponse(csv_chunks(rows), content_type='text/csv')
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
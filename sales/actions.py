@@ -1,9 +1,48 @@
-# from django.contrib import admin
-#
-#
-# class MarkAsPaidAction(admin.SimpleAction):
-#     def action_allowed(self, request, queryset):
-#         return True
-#
-#     def action(self, request, queryset):
-#         queryset.update(state='paid')
+from django.contrib import admin, messages
+from django.core.exceptions import ValidationError
+
+from .reservations import cancel_sales, finish_sales, reopen_sales
+from .returns import complete_returns, process_returns
+
+
+def _run(modeladmin, request, queryset, change, verb):
+    # Changes every selected sale in one transaction; when the stock does not allow it, none is changed
+    try:
+        changed = change(queryset)
+    except ValidationError as error:
+        modeladmin.message_user(request, " ".join(error.messages), messages.ERROR)
+        return
+    skipped = queryset.count() - changed
+    message = f"{changed} sales {verb}."
+    if skipped:
+        message += f" {skipped} were skipped because their state does not allow it."
+    modeladmin.message_user(request, message, messages.SUCCESS if changed else messages.WARNING)
+
+
+@admin.action(description="Finish the selected pending sales")
+def finish_selected(modeladmin, request, queryset):
+    _run(modeladmin, request, queryset, finish_sales, "finished")
+
+
+@admin.action(description="Cancel the selected sales and restore their stock")
+def cancel_selected(modeladmin, request, queryset):
+    _run(modeladmin, request, queryset, cancel_sales, "canceled")
+
+
+@admin.action(description="Reopen the selected canceled sales")
+def reopen_selected(modeladmin, request, queryset):
+    _run(modeladmin, request, queryset, reopen_sales, "reopened")
+
+
+@admin.action(description="Process the selected returns")
+def process_selected_returns(modeladmin, request, queryset):
+    accepted, rejected = process_returns(queryset)
+    message = f"{accepted} returns processed."
+    if rejected:
+        message += f" {rejected} were rejected because they exceed the units sold."
+    modeladmin.message_user(request, message, messages.WARNING if rejected else messages.SUCCESS)
+
+
+@admin.action(description="Complete the selected processed returns")
+def complete_selected_returns(modeladmin, request, queryset):
+    modeladmin.message_user(request, f"{complete_returns(queryset)} returns completed.", messages.SUCCESS)
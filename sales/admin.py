@@ -1,8 +1,14 @@
 from django.contrib import admin
+from django.db.models import Prefetch
 
+from products.filters import TopRelatedListFilter
+from products.paginators import EstimatedCountPaginator
+from .actions import (cancel_selected, complete_selected_returns, finish_selected, process_selected_returns,
+                      reopen_selected)
+from .reservations import held_lines, move_sale_stock
 from .forms import SaleForm
 from .inlines import SaleItemInline
-from .models import Sale, SaleItem, Customer, Shipping
+from .models import Sale, SaleItem, Customer, Return, Shipping, StockReservation
 
 
 @admin.register(Sale)
@@ -10,23 +16,91 @@ class SaleAdmin(admin.ModelAdmin):
     inlines = [SaleItemInline]
     form = SaleForm
     list_display = ('state', 'customer', 'total', 'sale_date')
+    list_select_related = ('customer',)
     search_fields = ('customer__name', 'state')
-    list_filter = ('state', 'customer')
+    list_filter = ('state', ('customer', TopRelatedListFilter))
+    actions = [finish_selected, cancel_selected, reopen_selected]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # Totals are summed by the database instead of loading the items of every row
+        return super().get_queryset(request).with_totals()
+
+    def total(self, obj):
+        return obj.total
+
+    total.admin_order_field = 'items_total'
+
+    def save_related(self, request, form, formsets, change):
+        sale = form.instance
+        old_state = form.initial.get('state') if change else None
+        # Stock a finished sale took, read before the inlines replace its items
+        old_lines = held_lines(sale.pk, old_state) if old_state == 'finished' else []
+        super().save_related(request, form, formsets, change)
+        # The items only exist once the inlines are saved, so the stock is taken or reserved here.
+        # SaleItemFormSet has already checked the stock for the new state. A pending or finished sale
+        # whose items changed moves its stock again, so what it holds follows the items.
+        items_changed = any(formset.has_changed() for formset in formsets)
+        if old_state != sale.state or (sale.state in ('pending', 'finished') and items_changed):
+            move_sale_stock(sale, old_state, old_lines)
 
 
 @admin.register(SaleItem)
 class SaleItemAdmin(admin.ModelAdmin):
     list_display = ('product', 'quantity', 'sale_price', 'subtotal')
+    list_select_related = ('product',)
     search_fields = ('product__name', 'sale__sale_date')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Customer)
 class CustomerAdmin(admin.ModelAdmin):
     list_display = ('name', 'email', 'phone_number', 'gender')
     search_fields = ('name', 'email')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Shipping)
 class ShippingAdmin(admin.ModelAdmin):
     list_display = ('name', 'cost', 'estimated_delivery_date')
     search_fields = ('name',)
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('sale', 'inventory', 'quantity', 'expires_at')
+    list_select_related = ('inventory__product',)
+    readonly_fields = ('sale', 'inventory', 'quantity', 'created_at', 'expires_at')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # The sales are shown with their total, which is summed by the database for the whole page
+        return super().get_queryset(request).prefetch_related(Prefetch('sale', queryset=Sale.objects.with_totals()))
+
+
+# Returns are created pending; their status only changes through the actions, which move the stock
+@admin.register(Return)
+class ReturnAdmin(admin.ModelAdmin):
+    list_display = ('sale', 'product', 'quantity', 'condition', 'status', 'date_returned')
+    list_select_related = ('product',)
+    list_filter = ('status', 'condition')
+    search_fields = ('product__name', 'reason')
+    readonly_fields = ('status', 'date_returned')
+    actions = [process_selected_returns, complete_selected_returns]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # The sales are shown with their total, which is summed by the database for the whole page
+        return super().get_queryset(request).prefetch_related(Prefetch('sale', queryset=Sale.objects.with_totals()))
+
+    def get_readonly_fields(self, request, obj=None):
+        # Once a return leaves pending its units may have moved; editing what was returned would make
+        # restock_sales and the next returns subtract units that never came back
+        if obj is not None and obj.status != 'pending':
+            return self.readonly_fields + ('sale', 'product', 'quantity', 'condition')
+        return self.readonly_fields
@@ -1,6 +1,8 @@
 from django import forms
 
+from products.stock import InsufficientStockError, aggregate_lines, validate_stock
 from .models import Sale
+from .reservations import held_lines
 
 
 class SaleForm(forms.ModelForm):
@@ -11,3 +13,28 @@ class SaleForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # Personalizaciones aquí
+
+
+# Sale item formset that checks the stock of every line in one go
+class SaleItemFormSet(forms.BaseInlineFormSet):
+    def clean(self):
+        super().clean()
+        # A sale entering the pending or finished state, or one in those states whose items change,
+        # reserves or takes stock, see move_sale_stock. The stock the stored sale holds is given back
+        # first, so it counts as available.
+        sale = self.instance
+        stored_state = None if sale._state.adding else (
+            Sale.objects.filter(pk=sale.pk).values_list('state', flat=True).first())
+        if sale.state not in ('pending', 'finished'):
+            return
+        if stored_state == sale.state and not self.has_changed():
+            return
+
+        lines = [
+            (form.cleaned_data['product'].pk, form.cleaned_data.get('quantity'))
+            for form in self.forms
+            if form.cleaned_data.get('product') and not form.cleaned_data.get('DELETE')
+        ]
+        shortfalls = validate_stock(lines, held=aggregate_lines(held_lines(sale.pk, stored_state)))
+        if shortfalls:
+            raise InsufficientStockError(shortfalls)
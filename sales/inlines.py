@@ -1,8 +1,17 @@
 from django.contrib import admin
 
+from products.widgets import ProductAutocompleteSelect
+from sales.forms import SaleItemFormSet
 from sales.models import SaleItem
 
 
 class SaleItemInline(admin.TabularInline):
     model = SaleItem
-    extra = 1
\ No newline at end of file
+    formset = SaleItemFormSet
+    extra = 1
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        # Products are picked through the autocomplete, a full select would embed the whole catalog in every row
+        if db_field.name == 'product':
+            kwargs['widget'] = ProductAutocompleteSelect(db_field, self.admin_site)
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from sales.models import Return
+from sales.returns import OPEN_STATUSES, process_returns
+
+
+class Command(BaseCommand):
+    help = "Processes the open returns in batches, restocking sellable units and recording damaged ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Returns processed per transaction")
+        parser.add_argument('--complete', action='store_true',
+                            help="Complete the accepted returns instead of leaving them processed")
+
+    def handle(self, *args, **options):
+        accepted = rejected = 0
+        while True:
+            batch = Return.objects.filter(status__in=OPEN_STATUSES).order_by('pk')[:options['batch_size']]
+            batch_accepted, batch_rejected = process_returns(
+                Return.objects.filter(pk__in=list(batch.values_list('pk', flat=True))), complete=options['complete'])
+            if not batch_accepted and not batch_rejected:
+                break
+            accepted += batch_accepted
+            rejected += batch_rejected
+        self.stdout.write(self.style.SUCCESS(f"{accepted} returns processed, {rejected} rejected"))
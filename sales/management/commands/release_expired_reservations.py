@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from sales.reservations import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = "Releases the stock held by expired reservations of pending sales"
+
+    def handle(self, *args, **options):
+        released = release_expired_reservations()
+        self.stdout.write(self.style.SUCCESS(f"{released} expired reservations released"))
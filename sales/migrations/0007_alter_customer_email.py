@@ -0,0 +1,19 @@
+# Generated by Django 5.0.14 on 2026-10-18 17:55
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0006_alter_customer_phone_number_return'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customer',
+            name='email',
+            field=models.EmailField(blank=True, db_index=True, help_text='Enter customer email', max_length=254, null=True, unique=True, validators=[django.core.validators.EmailValidator()], verbose_name='Email'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.14 on 2026-10-18 17:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0015_inventory_reserved_stock_product_reserved_stock'),
+        ('sales', '0007_alter_customer_email'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(help_text='Units held')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True, help_text='Moment the reservation is released')),
+                ('inventory', models.ForeignKey(help_text='Inventory the stock is held on', on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='products.inventory')),
+                ('sale', models.ForeignKey(help_text='Pending sale holding the stock', on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='sales.sale')),
+            ],
+            options={
+                'verbose_name': 'stock reservation',
+                'verbose_name_plural': 'stock reservations',
+                'db_table': 'StockReservations',
+            },
+        ),
+    ]
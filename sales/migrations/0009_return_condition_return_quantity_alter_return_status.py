@@ -0,0 +1,28 @@
+# Generated by Django 5.0.14 on 2026-10-18 18:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0008_stockreservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='return',
+            name='condition',
+            field=models.CharField(choices=[('sellable', 'Sellable'), ('damaged', 'Damaged')], default='sellable', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='return',
+            name='quantity',
+            field=models.PositiveIntegerField(default=1, help_text='Units returned'),
+        ),
+        migrations.AlterField(
+            model_name='return',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('in_process', 'In Process'), ('processed', 'Processed'), ('completed', 'Completed'), ('cancelled', 'Cancelled'), ('rejected', 'Rejected')], db_index=True, default='pending', max_length=20),
+        ),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
 from django.forms.models import model_to_dict
 from django.core.validators import RegexValidator
 from django.core.validators import EmailValidator
@@ -49,6 +51,14 @@ class Customer(models.Model):
         db_table = "Customers"
 
 
+class SaleQuerySet(models.QuerySet):
+    def with_totals(self):
+        # Adds the sum of the item subtotals computed by the database as `items_total`.
+        amount = DecimalField(max_digits=12, decimal_places=2)
+        return self.annotate(items_total=Coalesce(
+            Sum(F('items__sale_price') * F('items__quantity'), output_field=amount), Value(0), output_field=amount))
+
+
 class Sale(models.Model):
     STATE = [
         ('canceled', 'Canceled'),
@@ -61,9 +71,18 @@ class Sale(models.Model):
     sale_date = models.DateTimeField(auto_now_add=True, help_text="Sale date", db_index=True)
     state = models.CharField(max_length=120, choices=STATE, default='finished')
 
+    objects = SaleQuerySet.as_manager()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Customer the row was loaded with, so changing it also refreshes the old customer's rollups
+        self._loaded_customer_id = self.__dict__.get('customer_id')
+
     @property
     def total(self):
-        # Calculates the total of the purchase by adding the subtotals of all the items.
+        # Uses the total annotated by SaleQuerySet.with_totals() when the sale was loaded with it.
+        if hasattr(self, 'items_total'):
+            return self.items_total
         return sum(item.subtotal for item in self.items.all())
 
     def __str__(self):
@@ -83,6 +102,12 @@ class SaleItem(models.Model):
     quantity = models.IntegerField(default=1, null=True, blank=True, help_text="Number of products sold")
     sale_price = models.DecimalField(default=0.00, max_digits=10, decimal_places=2, help_text="Sale price")
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Sale and product the row was loaded with, so moving the item also refreshes the rollups it left
+        self._loaded_sale_id = self.__dict__.get('sale_id')
+        self._loaded_product_id = self.__dict__.get('product_id')
+
     @property
     def subtotal(self):
         # Calculates the subtotal of the purchase item.
@@ -106,10 +131,36 @@ class Return(models.Model):
         ('cancelled', 'Cancelled'),
         ('rejected', 'Rejected'),
     ]
+    CONDITION_CHOICES = [
+        ('sellable', 'Sellable'),
+        ('damaged', 'Damaged'),
+    ]
     sale = models.ForeignKey(Sale, on_delete=models.CASCADE, related_name='returns')
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='returns')
+    quantity = models.PositiveIntegerField(default=1, help_text="Units returned")
+    # Sellable units go back into stock, damaged ones are recorded on the product issue (see sales/returns.py)
+    condition = models.CharField(max_length=20, choices=CONDITION_CHOICES, default='sellable')
     reason = models.TextField()
     date_returned = models.DateTimeField(auto_now_add=True)
-    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
 
+    def __str__(self):
+        return f"{self.product_id} x{self.quantity} - {self.status}"
 
+
+class StockReservation(models.Model):
+    sale = models.ForeignKey(Sale, on_delete=models.CASCADE, related_name='reservations',
+                             help_text="Pending sale holding the stock")
+    inventory = models.ForeignKey(Inventory, on_delete=models.CASCADE, related_name='reservations',
+                                  help_text="Inventory the stock is held on")
+    quantity = models.PositiveIntegerField(help_text="Units held")
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True, help_text="Moment the reservation is released")
+
+    def __str__(self):
+        return f"{self.sale_id} - {self.inventory_id} - {self.quantity}"
+
+    class Meta:
+        verbose_name = 'stock reservation'
+        verbose_name_plural = 'stock reservations'
+        db_table = "StockReservations"
@@ -0,0 +1,194 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from outbox.events import emit_many
+from products.models import Inventory
+from products.stock import decrement_stock, increment_stock, release_stock, reserve_stock
+from .models import Return, Sale, SaleItem, StockReservation
+from .returns import DONE_STATUSES
+
+
+def _item_lines(sale_ids):
+    # (product_id, quantity) over every item of the sales, summed by the database in one query
+    return list(SaleItem.objects.filter(sale_id__in=sale_ids, product__isnull=False).values('product_id')
+                .annotate(total=Sum('quantity')).values_list('product_id', 'total').order_by())
+
+
+def _reference(sale_ids):
+    # Ledger movements of a single sale point at it; bulk movements belong to no sale in particular
+    return sale_ids[0] if len(sale_ids) == 1 else None
+
+
+def reserve_sales(sales, ttl=None):
+    """
+    Holds the stock of every item of the given sales until the reservations expire.
+    The stock of all the sales is reserved at once and then split into one reservation per sale
+    and inventory.
+    """
+    ttl = settings.STOCK_RESERVATION_TTL if ttl is None else ttl
+    with transaction.atomic():
+        items = list(SaleItem.objects.filter(sale__in=sales, product__isnull=False)
+                     .values('sale_id', 'product_id').annotate(units=Sum('quantity'))
+                     .values_list('sale_id', 'product_id', 'units').order_by('product_id', 'sale_id'))
+        reserved = reserve_stock((product_id, units) for _, product_id, units in items)
+
+        # Units held on each inventory, per product, handed out to the sales in order
+        products = dict(Inventory.objects.filter(pk__in=reserved).values_list('pk', 'product_id'))
+        held = defaultdict(list)
+        for inventory_id, units in sorted(reserved.items()):
+            held[products[inventory_id]].append([inventory_id, units])
+
+        expires_at = timezone.now() + timedelta(seconds=ttl)
+        reservations = []
+        for sale_id, product_id, units in items:
+            rows = held[product_id]
+            while units:
+                taken = min(units, rows[0][1])
+                reservations.append(StockReservation(sale_id=sale_id, inventory_id=rows[0][0], quantity=taken,
+                                                     expires_at=expires_at))
+                units -= taken
+                rows[0][1] -= taken
+                if not rows[0][1]:
+                    rows.pop(0)
+        StockReservation.objects.bulk_create(reservations)
+
+
+def reserve_sale(sale, ttl=None):
+    # Holds the stock of every item of a pending sale until the reservation expires.
+    reserve_sales(Sale.objects.filter(pk=sale.pk), ttl)
+
+
+def release_reservations(reservations):
+    """
+    Releases a queryset of reservations in bulk: one aggregate, one delete and one inventory update.
+    Returns the number of reservations released.
+    """
+    with transaction.atomic():
+        # Reservations are locked before the inventories, the same order every caller uses
+        ids = list(reservations.select_for_update().values_list('pk', flat=True))
+        if not ids:
+            return 0
+        locked = StockReservation.objects.filter(pk__in=ids)
+        reserved = dict(locked.values('inventory_id').annotate(total=Sum('quantity'))
+                        .values_list('inventory_id', 'total'))
+        locked.delete()
+        release_stock(reserved)
+    return len(ids)
+
+
+def release_expired_reservations(now=None):
+    return release_reservations(StockReservation.objects.filter(expires_at__lte=now or timezone.now()))
+
+
+def _unreturned_lines(sale_ids):
+    # (product_id, quantity) of the items of finished sales still out of stock: the units of processed
+    # and completed returns already came back (sellable) or went to the product issues (damaged)
+    returned = dict(Return.objects.filter(sale_id__in=sale_ids, status__in=DONE_STATUSES).values('product_id')
+                    .annotate(total=Sum('quantity')).values_list('product_id', 'total').order_by())
+    return [(product_id, quantity - returned.get(product_id, 0)) for product_id, quantity in _item_lines(sale_ids)
+            if quantity > returned.get(product_id, 0)]
+
+
+def held_lines(sale_id, state):
+    # (product_id, quantity) of the stock a stored sale holds in `state`:
+    # its reservations while pending, its unreturned items once finished
+    if state == 'pending':
+        return list(StockReservation.objects.filter(sale_id=sale_id).values('inventory__product_id')
+                    .annotate(total=Sum('quantity')).values_list('inventory__product_id', 'total').order_by())
+    if state == 'finished':
+        return _unreturned_lines([sale_id])
+    return []
+
+
+def move_sale_stock(sale, old_state, old_lines):
+    """
+    Moves the stock of a sale saved from `old_state` (None for a new sale) to its current state.
+    What the old state held is given back first, the reservations of a pending sale or the
+    `old_lines` a finished sale took; then the current items are reserved for a pending sale
+    or taken for a finished one, less the units its processed returns already handled.
+    """
+    with transaction.atomic():
+        if old_state == 'pending':
+            release_reservations(sale.reservations.all())
+        elif old_state == 'finished':
+            increment_stock(old_lines, 'cancellation', reference=sale.pk)
+        if sale.state == 'pending':
+            reserve_sale(sale)
+        elif sale.state == 'finished':
+            decrement_stock(_unreturned_lines([sale.pk]), reference=sale.pk)
+
+
+def restock_sales(sale_ids):
+    # Puts the items of canceled sales back into stock, less what their returns already handled,
+    # with two aggregated queries and one update.
+    increment_stock(_unreturned_lines(sale_ids), 'cancellation', reference=_reference(sale_ids))
+
+
+# Bulk state changes. Each one locks the sales it changes, moves the stock of all of them with
+# a fixed number of queries, and skips the sales that are not in a state it applies to.
+
+def _lock_sales(sales, *states):
+    # Ids of the sales in the given states, locked until the transaction ends, by state
+    locked = defaultdict(list)
+    for pk, state in (Sale.objects.select_for_update().filter(pk__in=sales.values('pk'), state__in=states)
+                      .order_by('pk').values_list('pk', 'state')):
+        locked[state].append(pk)
+    return locked
+
+
+def _change_state(sale_ids, state):
+    Sale.objects.filter(pk__in=sale_ids).update(state=state)
+    # Bulk updates send no post_save, so the outbox events are written here
+    emit_many('sale.changed', [{'sale_id': pk} for pk in sale_ids])
+
+
+def finish_sales(sales):
+    # Pending sales give back their reservations and take their stock. Returns how many were finished.
+    with transaction.atomic():
+        sale_ids = _lock_sales(sales, 'pending')['pending']
+        if sale_ids:
+            release_reservations(StockReservation.objects.filter(sale_id__in=sale_ids))
+            decrement_stock(_item_lines(sale_ids), reference=_reference(sale_ids))
+            _change_state(sale_ids, 'finished')
+    return len(sale_ids)
+
+
+def _give_back_stock(locked):
+    # Pending sales release their reservations, finished ones put their stock back
+    if locked['pending']:
+        release_reservations(StockReservation.objects.filter(sale_id__in=locked['pending']))
+    if locked['finished']:
+        restock_sales(locked['finished'])
+
+
+def cancel_sales(sales):
+    # Pending sales release their reservations, finished ones put their stock back. Returns how many were canceled.
+    with transaction.atomic():
+        locked = _lock_sales(sales, 'pending', 'finished')
+        _give_back_stock(locked)
+        sale_ids = locked['pending'] + locked['finished']
+        if sale_ids:
+            _change_state(sale_ids, 'canceled')
+    return len(sale_ids)
+
+
+def reopen_sales(sales):
+    # Canceled sales go back to pending and reserve their stock again. Returns how many were reopened.
+    with transaction.atomic():
+        sale_ids = _lock_sales(sales, 'canceled')['canceled']
+        if sale_ids:
+            reserve_sales(Sale.objects.filter(pk__in=sale_ids))
+            _change_state(sale_ids, 'pending')
+    return len(sale_ids)
+
+
+def release_deleted_sales(sales):
+    # Gives back the stock of sales about to be deleted, before their reservations and returns
+    # are deleted with them: reserved_stock would stay held, and the units taken would never come back.
+    with transaction.atomic():
+        _give_back_stock(_lock_sales(sales, 'pending', 'finished'))
@@ -0,0 +1,103 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, Sum, Value, When
+
+from outbox.events import emit_many
+from products.models import ProductIssue
+from products.stock import aggregate_lines, increment_stock
+from .models import Return, SaleItem
+
+# Returns waiting to be processed, and returns whose units are already back
+OPEN_STATUSES = ('pending', 'in_process')
+DONE_STATUSES = ('processed', 'completed')
+
+
+def _record_damaged(lines):
+    # Adds damaged (product_id, quantity) units to the issue of each product, creating the missing issues.
+    quantities = aggregate_lines(lines)
+    if not quantities:
+        return
+    existing = set(ProductIssue.objects.select_for_update().filter(product_id__in=quantities)
+                   .values_list('product_id', flat=True))
+    if existing:
+        ProductIssue.objects.filter(product_id__in=existing).update(
+            quantity=F('quantity') + Case(*(When(product_id=pk, then=Value(quantities[pk])) for pk in existing)),
+            issue_type=Case(When(issue_type='default', then=Value('damaged')), default=F('issue_type')),
+        )
+    ProductIssue.objects.bulk_create([
+        ProductIssue(product_id=pk, issue_type='damaged', quantity=units, notes="Damaged returns")
+        for pk, units in sorted(quantities.items()) if pk not in existing
+    ])
+
+
+def _sold_quantities(rows):
+    # Units sold and units already returned per (sale, product), two grouped queries for the whole batch
+    sale_ids = {sale_id for _, sale_id, _, _, _ in rows}
+    product_ids = {product_id for _, _, product_id, _, _ in rows}
+    sold = {
+        (sale_id, product_id): units for sale_id, product_id, units in
+        SaleItem.objects.filter(sale_id__in=sale_ids, sale__state='finished', product_id__in=product_ids)
+        .values('sale_id', 'product_id').annotate(units=Sum('quantity'))
+        .values_list('sale_id', 'product_id', 'units').order_by()
+    }
+    returned = defaultdict(int, {
+        (sale_id, product_id): units for sale_id, product_id, units in
+        Return.objects.filter(sale_id__in=sale_ids, product_id__in=product_ids, status__in=DONE_STATUSES)
+        .values('sale_id', 'product_id').annotate(units=Sum('quantity'))
+        .values_list('sale_id', 'product_id', 'units').order_by()
+    })
+    return sold, returned
+
+
+def _set_status(return_ids, status):
+    Return.objects.filter(pk__in=return_ids).update(status=status)
+    # Bulk updates send no post_save, so the outbox events are written here
+    emit_many('return.changed', [{'return_id': pk} for pk in return_ids])
+
+
+def process_returns(returns, complete=False):
+    """
+    Processes the pending and in-process returns of a queryset in one transaction.
+
+    Each return is checked against what its finished sale sold, less what was already returned;
+    returns asking for more are rejected. The accepted sellable units go back into stock with one
+    set-based update, damaged units are recorded on the product issues instead. Accepted returns
+    end up processed, or completed when `complete` is set. Returns (accepted, rejected) counts.
+    """
+    with transaction.atomic():
+        rows = list(Return.objects.select_for_update().filter(pk__in=returns.values('pk'), status__in=OPEN_STATUSES)
+                    .order_by('pk').values_list('pk', 'sale_id', 'product_id', 'quantity', 'condition'))
+        if not rows:
+            return 0, 0
+
+        sold, returned = _sold_quantities(rows)
+        accepted, rejected = [], []
+        for row in rows:
+            pk, sale_id, product_id, quantity, condition = row
+            if returned[sale_id, product_id] + quantity <= sold.get((sale_id, product_id), 0):
+                returned[sale_id, product_id] += quantity
+                accepted.append(row)
+            else:
+                rejected.append(pk)
+
+        sellable = [row for row in accepted if row[4] == 'sellable']
+        increment_stock([(row[2], row[3]) for row in sellable], 'return',
+                        reference=sellable[0][0] if len(sellable) == 1 else None)
+        _record_damaged([(row[2], row[3]) for row in accepted if row[4] == 'damaged'])
+
+        if accepted:
+            _set_status([row[0] for row in accepted], 'completed' if complete else 'processed')
+        if rejected:
+            _set_status(rejected, 'rejected')
+    return len(accepted), len(rejected)
+
+
+def complete_returns(returns):
+    # Closes the processed returns of a queryset with one update. Returns how many were completed.
+    with transaction.atomic():
+        return_ids = list(Return.objects.select_for_update().filter(pk__in=returns.values('pk'), status='processed')
+                          .values_list('pk', flat=True))
+        if return_ids:
+            _set_status(return_ids, 'completed')
+    return len(return_ids)
@@ -1,54 +1,75 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models import Subquery
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
-from django.core.cache import cache
-from django.core.exceptions import ValidationError
-from django.db import transaction
+from django.utils import timezone
 
-from products.models import Inventory
-from .models import Return, Sale
+from outbox.events import emit
+from products.models import Product
+from .models import Return, Sale, SaleItem
+from .reservations import release_deleted_sales
+
+
+@receiver(pre_delete, sender=Sale)
+def release_sale_stock(sender, instance, **kwargs):
+    # Runs inside the deletion's transaction, so the stock only moves if the sale is really deleted
+    release_deleted_sales(Sale.objects.filter(pk=instance.pk))
+
+
+# Rollups and dashboard figures follow the sales through the outbox, once the change has committed.
+# The handler rebuilds the rollup rows of the sale's current items; an event also carries the keys
+# an item counted under before it was moved or deleted, which the database no longer knows.
+
+def _day(sale):
+    return timezone.localdate(sale.sale_date).isoformat()
+
+
+def _item_keys(sale_id, product_id):
+    # Rollup keys of an item of the sale and product, read with one query; None without a sale
+    row = (Sale.objects.filter(pk=sale_id)
+           .annotate(day=TruncDate('sale_date'),
+                     category_id=Subquery(Product.objects.filter(pk=product_id).values('category_id')))
+           .values_list('day', 'customer_id', 'category_id').first())
+    if row is None:
+        return None
+    day, customer_id, category_id = row
+    return {'day': day.isoformat(), 'products': [product_id], 'categories': [category_id],
+            'customers': [customer_id]}
 
 
 @receiver(post_save, sender=Sale)
-def update_inventory_on_sale(sender, instance, created, **kwargs):
-    if created:
-        with transaction.atomic():
-            for item in instance.saleitem_set.all():
-                product_id = item.product.id
-                try:
-                    inventory_data = cache.get(f'inventory:{product_id}')
-                    if inventory_data:
-                        current_stock = inventory_data
-                    else:
-                        inventory = Inventory.objects.get(product=item.product)
-                        current_stock = inventory.current_stock
-                        cache.set(f'inventory:{product_id}', current_stock, timeout=300)
-
-                    new_stock = current_stock - item.quantity
-                    cache.set(f'inventory:{product_id}', new_stock, timeout=300)
-                    inventory.current_stock = new_stock
-                    inventory.save()
-                    cache.delete(f'inventory:{product_id}')  # # Invalidate cache after update
-                except Inventory.DoesNotExist:
-                    print(f"Product with ID {product_id} not found in inventory.")
-
-
-@receiver(pre_save, sender=Return)
-def update_inventory_on_return(sender, instance, **kwargs):
-    if instance.status == 'returned':
-        inventory = Inventory.objects.get(product=instance.product)
-        inventory.current_stock += instance.product.quantity
-        inventory.save()
-
-
-@receiver(pre_save, sender=Sale)
-def check_stock_availability(sender, instance, **kwargs):
-    """
-    Check if the total quantity of products in the sale does not exceed the available stock.
-    """
-    inventory_items = Inventory.objects.only('product', 'current_stock').prefetch_related('product').filter(
-        product__in=instance.saleitem_set.values_list('product', flat=True))
-
-    for item in instance.saleitem_set.all():
-        inventory_item = next((i for i in inventory_items if i.product == item.product), None)
-        if inventory_item and item.quantity > inventory_item.current_stock:
-            raise ValidationError(f"The stock of the product {item.product.name} is insufficient to complete the sale.")
+def record_sale_change(sender, instance, created, **kwargs):
+    if created or instance.customer_id == instance._loaded_customer_id:
+        emit('sale.changed', sale_id=instance.pk)
+    else:
+        emit('sale.changed', sale_id=instance.pk, day=_day(instance), customers=[instance._loaded_customer_id])
+    instance._loaded_customer_id = instance.customer_id
+
+
+@receiver(pre_delete, sender=Sale)
+def record_sale_deletion(sender, instance, **kwargs):
+    # Read before the items are detached from the sale
+    items = list(instance.items.values_list('product_id', 'product__category_id').distinct())
+    emit('sale.changed', sale_id=instance.pk, day=_day(instance), products=[pk for pk, _ in items],
+         categories=[pk for _, pk in items], customers=[instance.customer_id])
+
+
+@receiver(post_save, sender=SaleItem)
+def record_sale_item_change(sender, instance, created, **kwargs):
+    emit('sale.changed', sale_id=instance.sale_id)
+    moved = (instance.sale_id, instance.product_id) != (instance._loaded_sale_id, instance._loaded_product_id)
+    if not created and moved:
+        keys = _item_keys(instance._loaded_sale_id, instance._loaded_product_id)
+        if keys:
+            emit('sale.changed', sale_id=instance._loaded_sale_id, **keys)
+    instance._loaded_sale_id, instance._loaded_product_id = instance.sale_id, instance.product_id
+
+
+@receiver(post_delete, sender=SaleItem)
+def record_sale_item_deletion(sender, instance, **kwargs):
+    emit('sale.changed', sale_id=instance.sale_id, **(_item_keys(instance.sale_id, instance.product_id) or {}))
+
+
+@receiver(post_save, sender=Return)
+def record_return_change(sender, instance, **kwargs):
+    emit('return.changed', return_id=instance.pk)
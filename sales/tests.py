@@ -1,3 +1,222 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import RequestFactory, TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.utils import timezone
+
+from products.models import Category, Product, ProductIssue, Inventory
+from products.stock import decrement_stock
+from .models import Customer, Return, Sale, SaleItem, StockReservation
+from .reservations import cancel_sales, finish_sales, release_expired_reservations, reopen_sales, reserve_sale
+from .returns import complete_returns, process_returns
+
+
+class ConcurrentSaleStockTests(TransactionTestCase):
+    # Concurrent checkouts must never sell more units than the inventories hold.
+    threads = 16
+    sales_per_thread = 10
+
+    def setUp(self):
+        category = Category.objects.create(name='Shoes')
+        self.products = [Product.objects.create(category=category, name=f'Product {i}', description='')
+                         for i in range(3)]
+        for product in self.products:
+            Inventory.objects.create(product=product, current_stock=20)
+            Inventory.objects.create(product=product, current_stock=15)
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_concurrent_sales_do_not_oversell(self):
+        sold = []
+        rejected = []
+        errors = []
+        start = threading.Barrier(self.threads)
+
+        def checkout(worker):
+            # Each worker sells the products in a different order to provoke lock ordering problems
+            lines = [(product.pk, 1 + worker % 2) for product in self.products]
+            lines = lines[worker % len(lines):] + lines[:worker % len(lines)]
+            start.wait()
+            try:
+                for _ in range(self.sales_per_thread):
+                    try:
+                        decrement_stock(lines)
+                        sold.append(lines)
+                    except ValidationError:
+                        rejected.append(lines)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=checkout, args=(i,)) for i in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        self.assertTrue(rejected)
+        for product in self.products:
+            units_sold = sum(quantity for lines in sold for product_id, quantity in lines if product_id == product.pk)
+            product.refresh_from_db()
+            self.assertLessEqual(units_sold, 35)
+            self.assertEqual(product.stock, 35 - units_sold)
+            self.assertEqual(sum(product.inventories.values_list('current_stock', flat=True)), product.stock)
+
+    def test_sale_is_rejected_as_a_whole(self):
+        first, second, _ = self.products
+        with self.assertRaises(ValidationError):
+            decrement_stock([(first.pk, 5), (second.pk, 36)])
+        first.refresh_from_db()
+        self.assertEqual(first.stock, 35)
+
+    def test_sale_spans_inventories_in_a_single_movement(self):
+        first = self.products[0]
+        with self.assertNumQueries(8):
+            decrement_stock([(first.pk, 10), (first.pk, 20)])
+        first.refresh_from_db()
+        self.assertEqual(first.stock, 5)
+
+
+class SaleAdminStockTests(TestCase):
+    # Saving a sale through the admin moves its stock to follow its state and items.
+
+    def setUp(self):
+        category = Category.objects.create(name='Shoes')
+        self.product = Product.objects.create(category=category, name='Product', description='')
+        Inventory.objects.create(product=self.product, current_stock=10)
+        self.customer = Customer.objects.create(name='Customer', phone_number='+10000000001', email='c@example.com')
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.login(username='admin', password='password')
+
+    def save(self, state, quantity, sale=None):
+        data = {
+            'customer': self.customer.pk, 'shipping': '', 'state': state,
+            'items-TOTAL_FORMS': '1', 'items-INITIAL_FORMS': '1' if sale else '0',
+            'items-MIN_NUM_FORMS': '0', 'items-MAX_NUM_FORMS': '1000',
+            'items-0-product': self.product.pk, 'items-0-quantity': quantity, 'items-0-sale_price': '1.00',
+        }
+        if sale:
+            data.update({'items-0-id': sale.items.get().pk, 'items-0-sale': sale.pk})
+        url = f'/sales/sale/{sale.pk}/change/' if sale else '/sales/sale/add/'
+        response = self.client.post(url, data)
+        self.product.refresh_from_db()
+        return response
+
+    def test_editing_a_finished_sale_moves_its_stock(self):
+        self.assertEqual(self.save('finished', 3).status_code, 302)
+        sale = Sale.objects.get()
+        self.assertEqual(self.product.stock, 7)
+
+        self.assertEqual(self.save('finished', 8, sale).status_code, 302)
+        self.assertEqual(self.product.stock, 2)
+        self.save('finished', 1, sale)
+        self.assertEqual(self.product.stock, 9)
+
+        self.save('canceled', 1, sale)
+        self.assertEqual(self.product.stock, 10)
+
+    def test_editing_a_finished_sale_beyond_the_stock_is_rejected(self):
+        self.save('finished', 3)
+        sale = Sale.objects.get()
+
+        response = self.save('finished', 11, sale)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'is insufficient')
+        self.assertEqual(self.product.stock, 7)
+        self.assertEqual(sale.items.get().quantity, 3)
+
+    def test_deleting_a_sale_gives_back_its_stock(self):
+        self.save('pending', 4)
+        self.save('finished', 3)
+        self.assertEqual((self.product.stock, self.product.reserved_stock), (7, 4))
+
+        for sale in Sale.objects.all():
+            self.client.post(f'/sales/sale/{sale.pk}/delete/', {'post': 'yes'})
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved_stock), (10, 0))
+        self.assertEqual(self.product.inventories.get().reserved_stock, 0)
+
+
+class SaleLifecycleTests(TestCase):
+    # Reservations, returns and the bulk state changes keep the stock in step with the sales.
+
+    def setUp(self):
+        category = Category.objects.create(name='Shoes')
+        self.product = Product.objects.create(category=category, name='Product', description='')
+        Inventory.objects.create(product=self.product, current_stock=10)
+        self.sale = Sale.objects.create(state='pending')
+        SaleItem.objects.create(sale=self.sale, product=self.product, quantity=4, sale_price=1)
+        reserve_sale(self.sale)
+        self.sales = Sale.objects.filter(pk=self.sale.pk)
+
+    def assertStock(self, stock, reserved):
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved_stock), (stock, reserved))
+
+    def return_units(self, quantity, condition='sellable'):
+        return Return.objects.create(sale=self.sale, product=self.product, quantity=quantity, condition=condition)
+
+    def test_process_cancel_reopen_and_expire(self):
+        self.assertStock(10, 4)
+        self.assertEqual(finish_sales(self.sales), 1)
+        self.assertStock(6, 0)
+
+        returned = self.return_units(1)
+        self.assertEqual(process_returns(Return.objects.all()), (1, 0))
+        self.assertStock(7, 0)
+        returned.refresh_from_db()
+        self.assertEqual(returned.status, 'processed')
+
+        # The returned unit is already back, only the other three are restocked
+        self.assertEqual(cancel_sales(self.sales), 1)
+        self.assertStock(10, 0)
+
+        self.assertEqual(reopen_sales(self.sales), 1)
+        self.sale.refresh_from_db()
+        self.assertEqual(self.sale.state, 'pending')
+        self.assertStock(10, 4)
+
+        self.assertEqual(release_expired_reservations(timezone.now() + timedelta(days=1)), 1)
+        self.assertStock(10, 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_bulk_changes_skip_sales_in_other_states(self):
+        self.assertEqual(reopen_sales(self.sales), 0)
+        self.assertEqual(cancel_sales(self.sales), 1)
+        self.assertEqual(finish_sales(self.sales), 0)
+        self.assertStock(10, 0)
+
+    def test_damaged_units_go_to_the_product_issues(self):
+        finish_sales(self.sales)
+        self.return_units(1, 'damaged')
+        self.return_units(2, 'damaged')
+        # More units than the sale has left to return
+        rejected = self.return_units(2)
+
+        self.assertEqual(process_returns(Return.objects.all(), complete=True), (2, 1))
+        self.assertStock(6, 0)
+        self.assertEqual(ProductIssue.objects.get(product=self.product).quantity, 3)
+        rejected.refresh_from_db()
+        self.assertEqual(rejected.status, 'rejected')
+        self.assertEqual(complete_returns(Return.objects.all()), 0)
+
+        # Damaged units never came back, so canceling restocks the one unit left
+        cancel_sales(self.sales)
+        self.assertStock(7, 0)
+
+    def test_processed_returns_are_read_only(self):
+        model_admin = admin.site._registry[Return]
+        request = RequestFactory().get('/')
+        returned = self.return_units(1)
+        self.assertNotIn('quantity', model_admin.get_readonly_fields(request, returned))
+
+        finish_sales(self.sales)
+        process_returns(Return.objects.all())
+        returned.refresh_from_db()
+        self.assertTrue({'sale', 'product', 'quantity', 'condition'} <=
+                        set(model_admin.get_readonly_fields(request, returned)))
@@ -1,7 +1,10 @@
 from django.contrib import admin
 from django.db.models import Prefetch
 
-from products.models import Product
+from products.filters import TopRelatedListFilter
+from products.paginators import EstimatedCountPaginator
+from products.stock import apply_purchase
+from products.widgets import ProductAutocompleteSelect
 from .forms import PurchaseItemFormSet, PurchaseForm, PurchaseItemForm
 from .models import Purchase, PurchaseItem
 
@@ -12,6 +15,12 @@ class PurchaseItemInline(admin.TabularInline):
     formset = PurchaseItemFormSet
     extra = 1
 
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        # Los productos se eligen con el autocompletado; un select completo incrusta todo el catálogo en cada fila
+        if db_field.name == 'product':
+            kwargs['widget'] = ProductAutocompleteSelect(db_field, self.admin_site)
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
 
 # Configuración del panel de administración para Purchase
 @admin.register(Purchase)
@@ -20,12 +29,26 @@ class PurchaseAdmin(admin.ModelAdmin):
     readonly_fields = ('purchase_date', 'total')  # Campos de solo lectura
     inlines = [PurchaseItemInline]
     list_display = ('supplier', 'total', 'state', 'purchase_date', 'delivery_date')
-    list_filter = ('supplier', 'state')
+    list_filter = (('supplier', TopRelatedListFilter), 'state')
     search_fields = ('supplier__name',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def get_queryset(self, request):
-        # Optimización de consultas utilizando select_related
-        return super().get_queryset(request).select_related('supplier')
+        # Optimización de consultas utilizando select_related, con el total sumado por la base de datos
+        return super().get_queryset(request).select_related('supplier').with_totals()
+
+    def total(self, obj):
+        return obj.total
+
+    total.admin_order_field = 'items_total'
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Los artículos solo existen tras guardar los inlines; el stock entra cuando la compra se finaliza
+        purchase = form.instance
+        if purchase.state == 'finished' and (not change or form.initial.get('state') != 'finished'):
+            apply_purchase(purchase)
 
 
 # Configuración del panel de administración para PurchaseItem
@@ -33,10 +56,17 @@ class PurchaseAdmin(admin.ModelAdmin):
 class PurchaseItemAdmin(admin.ModelAdmin):
     form = PurchaseItemForm
     list_display = ('purchase', 'product', 'quantity', 'subtotal')
-    list_filter = ('purchase__supplier', 'product')
+    list_filter = (('purchase__supplier', TopRelatedListFilter), ('product', TopRelatedListFilter))
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def get_queryset(self, request):
-        # Optimización de consultas utilizando prefetch_related
-        return super().get_queryset(request).prefetch_related(
-            Prefetch('product', queryset=Product.objects.select_related('category'))
-        )
+        # Optimización de consultas utilizando select_related, con el subtotal calculado por la base de datos
+        return super().get_queryset(request).select_related('product').prefetch_related(
+            Prefetch('purchase', queryset=Purchase.objects.with_totals())
+        ).with_subtotals()
+
+    def subtotal(self, obj):
+        return obj.subtotal
+
+    subtotal.admin_order_field = 'subtotal_amount'
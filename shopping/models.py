@@ -1,7 +1,25 @@
 from django.db import models
+from django.db.models import DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
 from products.models import Product, Supplier
 
 
+class PurchaseQuerySet(models.QuerySet):
+    def with_totals(self):
+        # Adds the item subtotals plus tax computed by the database as `items_total`.
+        amount = DecimalField(max_digits=12, decimal_places=2)
+        return self.annotate(items_total=Coalesce(
+            Sum(F('items__product__purchase_price') * F('items__quantity'), output_field=amount), Value(0),
+            output_field=amount) + Coalesce(F('tax'), Value(0), output_field=amount))
+
+
+class PurchaseItemQuerySet(models.QuerySet):
+    def with_subtotals(self):
+        # Adds the purchase price times the quantity computed by the database as `subtotal_amount`.
+        return self.annotate(subtotal_amount=models.ExpressionWrapper(
+            F('product__purchase_price') * F('quantity'), output_field=DecimalField(max_digits=12, decimal_places=2)))
+
+
 class Purchase(models.Model):
     STATE = [
         ('canceled', 'Canceled'),
@@ -14,10 +32,14 @@ class Purchase(models.Model):
     purchase_date = models.DateTimeField(auto_now_add=True, help_text="Purchase date")
     delivery_date = models.DateField(null=True, blank=True, help_text="Delivery date")
 
+    objects = PurchaseQuerySet.as_manager()
+
     @property
     def total(self):
-        # Calculates the total of the purchase by adding the subtotals of all the items.
-        return sum(item.subtotal for item in self.items.all()) + self.tax
+        # Uses the total annotated by PurchaseQuerySet.with_totals() when the purchase was loaded with it.
+        if hasattr(self, 'items_total'):
+            return self.items_total
+        return sum(item.subtotal for item in self.items.all()) + (self.tax or 0)
 
     def __str__(self):
         # String representation of the Purchase object.
@@ -34,9 +56,13 @@ class PurchaseItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='purchase_items')
     quantity = models.PositiveIntegerField(default=1, help_text='Quantity of product')
 
+    objects = PurchaseItemQuerySet.as_manager()
+
     @property
     def subtotal(self):
-        # Calculates the subtotal of the purchase item.
+        # Uses the subtotal annotated by PurchaseItemQuerySet.with_subtotals() when available.
+        if hasattr(self, 'subtotal_amount'):
+            return self.subtotal_amount
         return self.product.purchase_price * self.quantity
 
     def __str__(self):